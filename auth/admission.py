@@ -0,0 +1,83 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+
+from config import FREE_TIER_MAX_CONNECTIONS
+from database import AsyncSessionLocal
+from models import Board, UserInfo
+from relay import AdmissionRejected
+
+# ===== Кеш власників дошок для admission =====
+ADMISSION_CACHE_TTL = float(os.getenv("ADMISSION_CACHE_TTL", 30))  # сек
+ADMISSION_CACHE_SIZE = int(os.getenv("ADMISSION_CACHE_SIZE", 4096))
+
+def board_not_found() -> AdmissionRejected:
+    # Новий екземпляр на кожну відмову — див. relay.limit_reached
+    return AdmissionRejected(4000, "Board not found")
+
+
+class FreeTierAdmission:
+    """
+    Admission для coll_server: дошка має бути зареєстрована через API,
+    а кімнати власників без PRO обмежені FREE_TIER_MAX_CONNECTIONS.
+
+    PRO-статус власника кешується на ADMISSION_CACHE_TTL секунд,
+    тож повторні підключення до тієї ж дошки не ходять у БД.
+    """
+
+    def __init__(self, ttl: float = ADMISSION_CACHE_TTL, max_boards: int = ADMISSION_CACHE_SIZE,
+                 free_limit: int = FREE_TIER_MAX_CONNECTIONS):
+        self.ttl = ttl
+        self.max_boards = max_boards
+        self.free_limit = free_limit
+        # {board_id: (expires_at, owner_is_pro)}
+        self._cache: "OrderedDict[str, Tuple[float, bool]]" = OrderedDict()
+
+    @staticmethod
+    async def _load_owner_is_pro(board_id: str) -> Optional[bool]:
+        # Один запит Board JOIN users замість board.owner (lazy load = другий запит)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(UserInfo.is_pro)
+                .join(Board, Board.owner_id == UserInfo.internal_id)
+                .where(Board.id == board_id)
+            )
+            row = result.first()
+            return bool(row.is_pro) if row else None
+
+    async def owner_is_pro(self, board_id: str) -> Optional[bool]:
+        """None — дошки не існує."""
+        now = time.monotonic()
+        cached = self._cache.get(board_id)
+        if cached is not None and cached[0] > now:
+            self._cache.move_to_end(board_id)
+            return cached[1]
+
+        found = await self._load_owner_is_pro(board_id)
+        if found is None:
+            # Відсутність не кешуємо: дошку можуть зареєструвати будь-якої миті
+            self._cache.pop(board_id, None)
+            return None
+
+        self._cache[board_id] = (now + self.ttl, found)
+        self._cache.move_to_end(board_id)
+        while len(self._cache) > self.max_boards:
+            self._cache.popitem(last=False)
+        return found
+
+    def invalidate(self, board_id: str | None = None):
+        """Скинути кеш дошки (або весь), напр. після зміни PRO-статусу власника."""
+        if board_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(board_id, None)
+
+    async def __call__(self, board_id: str) -> Optional[int]:
+        is_pro = await self.owner_is_pro(board_id)
+        if is_pro is None:
+            # Якщо дошка не зареєстрована через API - відхиляємо
+            raise board_not_found()
+        return None if is_pro else self.free_limit
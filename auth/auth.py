@@ -1,9 +1,24 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import asyncio
+import os
 import jwt
+from fastapi import HTTPException
 from config import SECRET_KEY, ALGORITHM, ACCESS_EXPIRE_MINUTES, REFRESH_EXPIRE_DAYS
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# ===== Хешування паролів =====
+# Вартість bcrypt (2^rounds). Старі хеші з іншою вартістю перехешовуються при вході
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# bcrypt відпускає GIL, тож потоки дають справжній паралелізм на кількох ядрах
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+# Скільки хешувань може чекати в черзі понад зайняті потоки; далі — 503
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", PASSWORD_HASH_WORKERS * 8))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_in_flight = 0
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -11,6 +26,31 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
 
+async def _run_hashing(fn, *args):
+    """
+    Виконує bcrypt у власному пулі потоків, щоб не блокувати event loop.
+    Якщо пул і черга заповнені — одразу 503, а не нескінченне очікування.
+    """
+    global _hash_in_flight
+    if _hash_in_flight >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE:
+        raise HTTPException(status_code=503, detail="Server is busy, try again later", headers={"Retry-After": "1"})
+
+    _hash_in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_in_flight -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hashing(pwd_context.hash, password)
+
+async def verify_and_update_async(password: str, hashed: str) -> tuple[bool, str | None]:
+    """
+    Перевірка пароля в пулі. Другий елемент — новий хеш, якщо старий
+    створено з іншою вартістю (BCRYPT_ROUNDS) і його треба зберегти.
+    """
+    return await _run_hashing(pwd_context.verify_and_update, password, hashed)
+
 def create_access_token(user_id: str) -> str:
     # Використовуйте datetime.utcnow() замість datetime.now()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_EXPIRE_MINUTES)
@@ -0,0 +1,103 @@
+"""
+Перевірка keyset-пагінації GET /boards/?limit=&cursor= на "незручних" даних:
+дошки з однаковим created_at і дошки, яким created_at дописала міграція.
+
+База піднімається до 0003, туди вставляються дошки з NULL created_at
+(їх заповнює 0004) і рядок "YYYY-MM-DD HH:MM:SS" без мікросекунд — так
+0004 заповнювала SQLite до виправлення (його нормалізує 0007). Далі
+`upgrade head` і прохід усіма сторінками для кожного --limits: кожна дошка
+має трапитись рівно один раз, а X-Next-Cursor — закінчитись.
+Код виходу 1, якщо сторінки повторюються або дошки губляться.
+
+    cd auth && python benchmarks/boards_keyset_check.py --limits 1,2,7
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import uuid
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AUTH_DIR)
+
+OWNER = "00000000-0000-0000-0000-00000000b0a7"
+
+
+def seed_legacy(url: str) -> list[str]:
+    # Синхронно і сирим SQL: схема ще на 0003, моделі вже новіші
+    from sqlalchemy import create_engine, text
+
+    tied = "2026-01-01 10:00:00.500000"
+    rows = [(f"tied-{i}", tied) for i in range(4)]
+    rows += [(f"null-{i}", None) for i in range(3)]
+    rows += [("old-backfill", "2026-01-01 10:00:00"), ("newest", "2026-02-01 09:00:00.000001")]
+    engine = create_engine(url.replace("+aiosqlite", ""))
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (internal_id, public_id, email, username, hashed_password, is_pro) "
+                          "VALUES (:id, :public_id, 'keyset@boardly.app', 'keyset', '-', 0)"),
+                     {"id": OWNER, "public_id": str(uuid.uuid4())})
+        conn.execute(text("INSERT INTO boards (id, owner_id, name, created_at) VALUES (:id, :owner, :id, :created_at)"),
+                     [{"id": board_id, "owner": OWNER, "created_at": created_at} for board_id, created_at in rows])
+    engine.dispose()
+    return [board_id for board_id, _ in rows]
+
+
+async def walk(client, headers: dict, limit: int, total: int) -> tuple[list[str], str | None]:
+    seen, cursors, cursor = [], set(), None
+    # Більше сторінок, ніж дошок, буває лише при зациклюванні
+    for _ in range(total + 1):
+        params = {"limit": limit, "fields": "id", **({"cursor": cursor} if cursor else {})}
+        resp = await client.get("/boards/", params=params, headers=headers)
+        if resp.status_code != 200:
+            return seen, f"HTTP {resp.status_code}: {resp.text}"
+        seen += [board["id"] for board in resp.json()]
+        cursor = resp.headers.get("x-next-cursor")
+        if cursor is None:
+            return seen, None
+        if cursor in cursors:
+            return seen, "X-Next-Cursor repeated"
+        cursors.add(cursor)
+    return seen, "pagination did not terminate"
+
+
+async def check(limits: list[int], expected: list[str]) -> bool:
+    import httpx
+    import main
+    from auth import create_access_token
+    from database import engine
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    headers = {"Authorization": f"Bearer {create_access_token(OWNER)}"}
+    ok = True
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://check") as client:
+        for limit in limits:
+            seen, error = await walk(client, headers, limit, len(expected))
+            if error is None and sorted(seen) != sorted(expected):
+                error = f"got {len(seen)} boards ({len(set(seen))} distinct), expected {len(expected)}"
+            ok = ok and error is None
+            print(f"[{'FAIL' if error else ' OK '}] limit={limit}: {len(seen)} boards" + (f" — {error}" if error else ""))
+    await engine.dispose()
+    return ok
+
+
+def main(args):
+    path = os.path.join(tempfile.mkdtemp(prefix="boardly-keyset-"), "users.db")
+    url = os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(AUTH_DIR, "alembic.ini"))
+    command.upgrade(config, "0003_lookup_indexes")
+    expected = seed_legacy(url)
+    command.upgrade(config, "head")
+
+    sys.exit(0 if asyncio.run(check(args.limits, expected)) else 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limits", default="1,2,7", type=lambda v: [int(s) for s in v.split(",")])
+    main(parser.parse_args())
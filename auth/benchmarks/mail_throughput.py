@@ -0,0 +1,135 @@
+"""
+Пропускна здатність і затримка вихідної пошти на локальному aiosmtpd.
+
+"before" — як було: нове SMTP-з'єднання (ehlo, quit) на кожен лист.
+"after"  — mail_queue.MailQueue: постійні з'єднання, пачки, повтори.
+--handshake-ms імітує вартість TLS-рукостискання та login на кожне з'єднання.
+
+Також перевіряються повтори і dead-letter: адреси flaky-* отримують 451
+на першу спробу, bounce-* — 550 (одразу в dead-letter).
+
+    pip install aiosmtpd
+    cd auth && python benchmarks/mail_throughput.py --messages 500 --handshake-ms 30
+"""
+import argparse
+import asyncio
+import os
+import smtplib
+import statistics
+import sys
+import time
+
+from aiosmtpd.controller import Controller
+
+os.environ.setdefault("MAIL_SMTP_STARTTLS", "false")
+os.environ.setdefault("MAIL_RETRY_BASE", "0.05")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mail_queue as mq  # noqa: E402
+from email_utils import build_confirmation_email  # noqa: E402
+
+
+class SinkHandler:
+    def __init__(self, handshake_ms: float):
+        self.handshake = handshake_ms / 1000
+        self.received = 0
+        self.seen_flaky: set[str] = set()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.handshake)
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bounce"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        rcpt = envelope.rcpt_tos[0]
+        if rcpt.startswith("flaky") and rcpt not in self.seen_flaky:
+            self.seen_flaky.add(rcpt)
+            return "451 Try again later"
+        self.received += 1
+        return "250 Message accepted"
+
+
+def send_per_connection(host: str, port: int, to_email: str):
+    # Колишній send_confirmation_email без starttls/login
+    server = smtplib.SMTP(host, port, timeout=30)
+    try:
+        server.ehlo()
+        server.send_message(build_confirmation_email(to_email, "123456"))
+    finally:
+        server.quit()
+
+
+async def run_before(host: str, port: int, messages: int, concurrency: int):
+    # BackgroundTasks виконує синхронні функції в пулі потоків starlette (40 потоків)
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        started = time.perf_counter()
+        async with sem:
+            await asyncio.to_thread(send_per_connection, host, port, f"user{i}@example.com")
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    return time.perf_counter() - started, sorted(latencies)
+
+
+async def run_after(messages: int):
+    queue = mq.MailQueue()
+    await queue.start()
+    started = time.perf_counter()
+    for i in range(messages):
+        queue.submit(build_confirmation_email(f"user{i}@example.com", "123456"))
+    await queue.drain()
+    elapsed = time.perf_counter() - started
+    metrics = queue.metrics()
+    await queue.stop()
+    return elapsed, metrics
+
+
+async def run_failures():
+    queue = mq.MailQueue()
+    await queue.start()
+    for to in ("ok@example.com", "flaky-1@example.com", "bounce-1@example.com"):
+        queue.submit(build_confirmation_email(to, "123456"))
+    await queue.drain()
+    metrics = queue.metrics()
+    dead = [d["to"] for d in queue.dead_letters]
+    await queue.stop()
+    return metrics, dead
+
+
+async def main(args):
+    handler = SinkHandler(args.handshake_ms)
+    controller = Controller(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    mq.SMTP_SERVER, mq.SMTP_PORT, mq.SMTP_USER = "127.0.0.1", args.port, ""
+    try:
+        elapsed, lat = await run_before("127.0.0.1", args.port, args.messages, args.concurrency)
+        print(f"before: {args.messages / elapsed:7.1f} msg/s, {args.messages} connections, "
+              f"p50={statistics.median(lat) * 1000:.0f}ms p99={lat[int(len(lat) * 0.99) - 1] * 1000:.0f}ms")
+
+        elapsed, m = await run_after(args.messages)
+        print(f"after:  {args.messages / elapsed:7.1f} msg/s, {m['connections_opened']} connections, "
+              f"{m['batches']} batches, p50={m['latency_ms']['p50']}ms p99={m['latency_ms']['p99']}ms")
+
+        m, dead = await run_failures()
+        print(f"failures: sent={m['sent']} retried={m['retried']} dead_lettered={m['dead_lettered']} dead={dead}")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--handshake-ms", type=float, default=30)
+    parser.add_argument("--port", type=int, default=8025)
+    asyncio.run(main(parser.parse_args()))
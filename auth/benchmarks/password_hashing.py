@@ -0,0 +1,81 @@
+"""
+Пропускна здатність входу на ядро і вплив bcrypt на event loop.
+
+1. Скільки перевірок пароля (≈ логінів) за секунду дає одне ядро
+   при різній вартості BCRYPT_ROUNDS.
+2. Затримка event loop, поки --concurrent логінів перевіряють пароль:
+   напряму в корутині (як було) і через пул auth.verify_and_update_async.
+
+    cd auth && python benchmarks/password_hashing.py --concurrent 16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from passlib.context import CryptContext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth  # noqa: E402
+
+PASSWORD = "BenchmarkPassword123!"
+
+
+def per_core(rounds: int, seconds: float = 2.0) -> float:
+    ctx = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    hashed = ctx.hash(PASSWORD)
+    done, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        ctx.verify(PASSWORD, hashed)
+        done += 1
+    return done / (time.perf_counter() - started)
+
+
+async def loop_lag(run_logins) -> tuple[float, float]:
+    """Максимальна затримка тіку event loop (мс) і загальний час логінів (с)."""
+    lag, stop = 0.0, False
+
+    async def ticker():
+        nonlocal lag
+        while not stop:
+            before = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - before - 0.001)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await run_logins()
+    elapsed = time.perf_counter() - started
+    stop = True
+    await tick
+    return lag * 1000, elapsed
+
+
+async def main(args):
+    print(f"cpu cores: {os.cpu_count()}, pool workers: {auth.PASSWORD_HASH_WORKERS}")
+    for rounds in (10, 11, 12, 13):
+        print(f"rounds={rounds:>2}: {per_core(rounds):7.1f} logins/s per core")
+
+    hashed = auth.pwd_context.hash(PASSWORD)
+
+    async def inline():
+        async def one():
+            auth.pwd_context.verify(PASSWORD, hashed)
+        await asyncio.gather(*(one() for _ in range(args.concurrent)))
+
+    async def pooled():
+        await asyncio.gather(*(auth.verify_and_update_async(PASSWORD, hashed) for _ in range(args.concurrent)))
+
+    for label, run in (("inline", inline), ("pool", pooled)):
+        lag, elapsed = await loop_lag(run)
+        print(f"{label:<6} rounds={auth.BCRYPT_ROUNDS} logins={args.concurrent}: "
+              f"max loop lag {lag:8.1f}ms, {args.concurrent / elapsed:6.1f} logins/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrent", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,93 @@
+"""
+Сторінки /auth/payment/success і /cancel: скільки коштує відповідь і скільки
+байтів іде мережею.
+
+"before" — колишній шлях: f-string на кожен запит і нестиснуте тіло.
+"after" — payment_pages: шаблон скомпільований при імпорті, готова сторінка
+з кешу разом із gzip/br варіантами і ETag; повторний візит — 304 без тіла.
+Запити йдуть через ASGI-застосунок, тож враховано і роутинг FastAPI.
+
+    cd auth && python benchmarks/payment_pages.py --requests 5000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import timeit
+
+import httpx
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AUTH_DIR)
+
+
+def mount_inline_page(app):
+    # Колишній рендер: форматування всього документа на кожен запит, без стиснення
+    from fastapi import Response
+    from payment_pages import COLOR_BG, COLOR_PRIMARY, ICON_ERROR, PAGE_TEMPLATE
+
+    @app.get("/bench/inline-cancel")
+    def inline_cancel():
+        body = PAGE_TEMPLATE.format(title="Payment Cancelled", icon=ICON_ERROR, color_bg=COLOR_BG,
+                                    color_primary=COLOR_PRIMARY,
+                                    message="You have cancelled the payment. No funds were deducted.")
+        return Response(content=body, media_type="text/html")
+
+
+async def hit(client, path: str, count: int, headers: dict) -> tuple[float, int]:
+    wire = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        resp = await client.get(path, headers=headers)
+        # Розмір тіла, як воно йде мережею (до розпакування httpx)
+        wire += int(resp.headers.get("content-length", 0))
+    return time.perf_counter() - started, wire // count
+
+
+def render_cost(count: int):
+    # Лише рендер, без HTTP: f-string + gzip на кожен запит проти готової сторінки з кешу
+    import gzip
+    from payment_pages import COLOR_BG, COLOR_PRIMARY, ICON_ERROR, PAGE_TEMPLATE, payment_page
+
+    def inline():
+        body = PAGE_TEMPLATE.format(title="Payment Cancelled", icon=ICON_ERROR, color_bg=COLOR_BG,
+                                    color_primary=COLOR_PRIMARY, message="No funds were deducted.")
+        gzip.compress(body.encode())
+
+    def cached():
+        payment_page("Payment Cancelled", "No funds were deducted.", is_success=False).variants["gzip"]
+
+    for label, fn in (("format+gzip", inline), ("cached", cached)):
+        per_call = timeit.timeit(fn, number=count) / count
+        print(f"{label:<11} {per_call * 1e6:8.1f}us/render")
+
+
+async def main(args):
+    import main
+
+    mount_inline_page(main.app)
+    # payment_routes вмикає INFO-логування, а httpx логує кожен запит
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        first = await client.get("/auth/payment/cancel", headers={"Accept-Encoding": args.encoding})
+        cases = [
+            ("before", "/bench/inline-cancel", {"Accept-Encoding": args.encoding}),
+            ("after", "/auth/payment/cancel", {"Accept-Encoding": args.encoding}),
+            ("after 304", "/auth/payment/cancel", {"Accept-Encoding": args.encoding,
+                                                   "If-None-Match": first.headers["etag"]}),
+        ]
+        for label, path, headers in cases:
+            elapsed, size = await hit(client, path, args.requests, headers)
+            print(f"{label:<10} {args.requests / elapsed:8.0f} req/s  {size:5d} bytes/response")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--encoding", default="br, gzip", help="Accept-Encoding клієнта")
+    args = parser.parse_args()
+    render_cost(args.requests)
+    asyncio.run(main(args))
@@ -0,0 +1,152 @@
+"""
+Активація PRO для групового подарунка (checkout.session.completed, mode=payment)
+на 1, 50 і 500 отримувачів: час обробки і кількість SQL-запитів.
+
+"before" — колишній activate_pro_subscription: завантаження кожного UserInfo
+в ORM, розрахунок pro_expires_at у циклі Python і flush кожного рядка.
+"after" — pro_status.extend_pro: блокування рядків і один UPDATE з
+CASE (MAX(pro_expires_at, now) + PRO_GIFT_DAYS). Для кожного розміру
+перевіряється, що обидва шляхи дають правильні дати: активний PRO
+подовжується від старої дати, решта отримує "момент запуску" + 30 днів.
+
+Частина отримувачів має активний PRO, частина — прострочений, решта — жодного.
+База — тимчасовий SQLite після `alembic upgrade head` або DATABASE_URL.
+
+    cd auth && python benchmarks/pro_activation.py --sizes 1,50,500 --repeat 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AUTH_DIR)
+
+
+async def activate_inline(session_data: dict, db) -> list[str]:
+    # Колишня реалізація (лише гілка mode=payment)
+    from sqlalchemy import select
+    from models import UserInfo
+
+    user_ids = session_data["metadata"]["beneficiaries"].split(",")
+    users = (await db.scalars(select(UserInfo).where(UserInfo.internal_id.in_(user_ids)))).all()
+    now = datetime.utcnow()
+    for user in users:
+        user.is_pro = True
+        base_date = user.pro_expires_at if (user.pro_expires_at and user.pro_expires_at > now) else now
+        user.pro_expires_at = base_date + timedelta(days=30)
+    return [user.internal_id for user in users]
+
+
+async def seed(count: int) -> list[tuple[str, datetime | None]]:
+    from database import AsyncSessionLocal
+    from models import UserInfo
+
+    now = datetime.utcnow()
+    states = [now + timedelta(days=12), now - timedelta(days=3), None]
+    users = [UserInfo(internal_id=str(uuid.uuid4()), email=f"gift{i}-{uuid.uuid4().hex[:6]}@boardly.app",
+                      username=f"gift{i}", hashed_password="-", pro_expires_at=states[i % 3],
+                      is_pro=states[i % 3] is not None)
+             for i in range(count)]
+    async with AsyncSessionLocal() as db:
+        db.add_all(users)
+        await db.commit()
+    return [(user.internal_id, user.pro_expires_at) for user in users]
+
+
+async def restore(users: list[tuple[str, datetime | None]]):
+    from sqlalchemy import update
+    from database import AsyncSessionLocal
+    from models import UserInfo
+
+    async with AsyncSessionLocal() as db:
+        for user_id, expires_at in users:
+            await db.execute(update(UserInfo).where(UserInfo.internal_id == user_id)
+                             .values(pro_expires_at=expires_at, is_pro=expires_at is not None))
+        await db.commit()
+
+
+async def expirations(user_ids: list[str]) -> dict[str, datetime]:
+    from sqlalchemy import select
+    from database import AsyncSessionLocal
+    from models import UserInfo
+
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(select(UserInfo.internal_id, UserInfo.pro_expires_at)
+                                .where(UserInfo.internal_id.in_(user_ids)))
+        return dict(rows.all())
+
+
+async def timed(handler, session_data: dict, counter: list) -> tuple[float, tuple[datetime, datetime]]:
+    from database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        counter[0] = 0
+        window_start, started = datetime.utcnow(), time.perf_counter()
+        await handler(session_data, db)
+        await db.commit()
+        return time.perf_counter() - started, (window_start, datetime.utcnow())
+
+
+def wrong_dates(users: list[tuple[str, datetime | None]], got: dict[str, datetime],
+                window: tuple[datetime, datetime]) -> int:
+    # "now" обробника лежить у вікні запуску; точність SQLite-шляху — мілісекунди
+    slack, month = timedelta(milliseconds=1), timedelta(days=30)
+    wrong = 0
+    for user_id, before in users:
+        if before and before > window[1]:
+            ok = abs(got[user_id] - (before + month)) <= slack
+        else:
+            ok = window[0] + month - slack <= got[user_id] <= window[1] + month + slack
+        wrong += not ok
+    return wrong
+
+
+async def main(args):
+    from sqlalchemy import event
+    from database import engine
+    from routes.payment_routes import activate_pro_subscription
+
+    statements = [0]
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count(*_):
+        statements[0] += 1
+
+    for size in args.sizes:
+        users = await seed(size)
+        user_ids = [user_id for user_id, _ in users]
+        session_data = {"mode": "payment", "customer": "cus_bench", "subscription": None,
+                        "metadata": {"beneficiaries": ",".join(user_ids)}}
+
+        for label, handler in (("before", activate_inline), ("after", activate_pro_subscription)):
+            runs = []
+            for _ in range(args.repeat):
+                await restore(users)
+                elapsed, window = await timed(handler, session_data, statements)
+                runs.append(elapsed)
+            wrong = wrong_dates(users, await expirations(user_ids), window)
+            print(f"{size:4d} beneficiaries {label:<6} {statistics.median(runs) * 1000:8.2f}ms "
+                  f"{statements[0]:4d} SQL statements, {wrong} wrong expirations")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1,50,500", type=lambda v: [int(s) for s in v.split(",")])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="boardly-pro-"), "users.db")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    from alembic import command
+    from alembic.config import Config
+    command.upgrade(Config(os.path.join(AUTH_DIR, "alembic.ini")), "head")
+
+    asyncio.run(main(args))
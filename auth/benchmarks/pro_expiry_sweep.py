@@ -0,0 +1,160 @@
+"""
+Вимкнення PRO за терміном: ліниве (у get_current_user) проти фонового
+pro_status.expire_pro.
+
+--users користувачів, з них --expired мають PRO з минулим терміном, і лише
+--active з них за період заходять через get_current_user.
+
+"before" — колишня перевірка в get_current_user: кожен такий вхід робить
+commit на шляху авторизації, а решта лишається is_pro=True (coll_server
+пускає їх без ліміту FREE_TIER_MAX_CONNECTIONS).
+"after" — один UPDATE ... WHERE pro_expires_at < now: час, план запиту
+(індекс ix_users_pro_expires_at) і скільки PRO лишилось прострочених.
+Наостанок — затримка доставки інвалідації через Redis pub/sub до іншого
+"воркера" (окремий UserInvalidationListener); без Redis цей крок пропускається.
+
+    cd auth && python benchmarks/pro_expiry_sweep.py --users 20000 --expired 0.1 --active 0.2
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AUTH_DIR)
+
+
+async def seed(count: int, expired_share: float) -> list[str]:
+    from sqlalchemy import insert
+    from database import AsyncSessionLocal
+    from models import UserInfo
+
+    now = datetime.utcnow()
+    rows, expired = [], []
+    for i in range(count):
+        user_id = str(uuid.uuid4())
+        roll = random.random()
+        if roll < expired_share:
+            expires_at = now - timedelta(hours=random.randint(1, 24 * 30))
+            expired.append(user_id)
+        elif roll < expired_share * 2:
+            expires_at = now + timedelta(days=random.randint(1, 30))
+        else:
+            expires_at = None
+        rows.append({"internal_id": user_id, "public_id": str(uuid.uuid4()), "email": f"sweep{i}@boardly.app",
+                     "username": f"sweep{i}", "hashed_password": "-", "is_pro": expires_at is not None,
+                     "pro_expires_at": expires_at})
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(UserInfo), rows)
+        await db.commit()
+    return expired
+
+
+async def stale_pro() -> int:
+    from sqlalchemy import func, select
+    from database import AsyncSessionLocal
+    from models import UserInfo
+
+    async with AsyncSessionLocal() as db:
+        return await db.scalar(select(func.count()).select_from(UserInfo).where(
+            UserInfo.is_pro.is_(True), UserInfo.pro_expires_at < datetime.utcnow()))
+
+
+async def lazy_expiry(user_ids: list[str]) -> float:
+    # Колишній get_current_user: читання користувача + commit, якщо термін минув
+    from sqlalchemy import select
+    from database import AsyncSessionLocal
+    from models import UserInfo
+
+    started = time.perf_counter()
+    for user_id in user_ids:
+        async with AsyncSessionLocal() as db:
+            user = await db.scalar(select(UserInfo).where(UserInfo.internal_id == user_id))
+            if user.is_pro and user.pro_expires_at and datetime.utcnow() > user.pro_expires_at:
+                user.is_pro = False
+                user.pro_expires_at = None
+                await db.commit()
+    return time.perf_counter() - started
+
+
+async def sweep_plan() -> str:
+    from sqlalchemy import text
+    from database import engine
+
+    if engine.dialect.name != "sqlite":
+        return "(план — лише для SQLite)"
+    async with engine.connect() as conn:
+        rows = await conn.execute(text(
+            "EXPLAIN QUERY PLAN UPDATE users SET is_pro = 0, pro_expires_at = NULL WHERE pro_expires_at < :now"
+        ), {"now": datetime.utcnow()})
+        return "; ".join(str(row[-1]) for row in rows)
+
+
+async def invalidation_latency(rounds: int) -> str:
+    from user_cache import UserInvalidationListener, publish_invalidation
+
+    received = asyncio.Event()
+    other_worker = UserInvalidationListener()
+    other_worker.add_handler(lambda user_ids: received.set())
+    await other_worker.start()
+    await asyncio.sleep(0.2)  # підписка
+    latencies = []
+    try:
+        for _ in range(rounds):
+            received.clear()
+            sent = time.perf_counter()
+            await publish_invalidation(str(uuid.uuid4()))
+            await asyncio.wait_for(received.wait(), 2.0)
+            latencies.append(time.perf_counter() - sent)
+    except asyncio.TimeoutError:
+        return "не доставлено (Redis недоступний?)"
+    finally:
+        await other_worker.stop()
+    latencies.sort()
+    return f"p50={latencies[len(latencies) // 2] * 1000:.2f}ms max={latencies[-1] * 1000:.2f}ms ({rounds} messages)"
+
+
+async def main(args):
+    from database import AsyncSessionLocal, engine
+    from pro_status import expire_pro
+
+    expired = await seed(args.users, args.expired)
+    active = random.sample(expired, k=int(len(expired) * args.active))
+    print(f"{args.users} users, {len(expired)} with expired PRO, {len(active)} of them log in")
+
+    elapsed = await lazy_expiry(active)
+    print(f"before  {len(active)} commits on the auth path ({elapsed * 1000:.0f}ms), "
+          f"{await stale_pro()} users still PRO after expiry")
+
+    print(f"after   plan: {await sweep_plan()}")
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        swept = await expire_pro(db)
+    print(f"after   one UPDATE expired {len(swept)} users in {(time.perf_counter() - started) * 1000:.1f}ms, "
+          f"{await stale_pro()} users still PRO after expiry")
+    await engine.dispose()
+
+    print(f"pub/sub invalidation to another worker: {await invalidation_latency(args.rounds)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--expired", type=float, default=0.1, help="частка користувачів з простроченим PRO")
+    parser.add_argument("--active", type=float, default=0.2, help="частка прострочених, що заходять")
+    parser.add_argument("--rounds", type=int, default=100)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="boardly-sweep-"), "users.db")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    from alembic import command
+    from alembic.config import Config
+    command.upgrade(Config(os.path.join(AUTH_DIR, "alembic.ini")), "head")
+
+    asyncio.run(main(args))
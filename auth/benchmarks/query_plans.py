@@ -0,0 +1,98 @@
+"""
+Перевірка планів запитів: гарячі вибірки за owner_id, stripe_customer_id і pro_expires_at
+мають іти через індекси з міграцій, а не повним скануванням таблиці.
+
+Схема створюється `alembic upgrade head` (а не create_all), тож перевіряється
+саме те, що отримає продакшн-база. Без DATABASE_URL — тимчасовий SQLite
+(EXPLAIN QUERY PLAN); з postgresql+asyncpg://... — EXPLAIN із
+enable_seqscan=off, бо на майже порожніх таблицях Postgres і так обере Seq Scan.
+Код виходу 1, якщо хоч один запит сканує таблицю.
+
+    cd auth && python benchmarks/query_plans.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AUTH_DIR)
+
+
+def queries():
+    from datetime import datetime
+
+    from sqlalchemy import func, select, tuple_
+    from models import Board, UserInfo
+
+    owner = "00000000-0000-0000-0000-000000000000"
+    page = select(Board.id, Board.name, Board.created_at).where(Board.owner_id == owner)
+    newest_first = (Board.created_at.desc(), Board.id.desc())
+    return {
+        "all boards (GET /boards/)": page.order_by(*newest_first),
+        "boards page 1 (?limit=100)": page.order_by(*newest_first).limit(101),
+        "boards page N (?cursor=)": page.where(
+            tuple_(Board.created_at, Board.id) < tuple_(datetime(2026, 1, 1), "b")
+        ).order_by(*newest_first).limit(101),
+        "board count (reconcile)": select(func.count()).select_from(Board).where(Board.owner_id == owner),
+        "board of owner (DELETE /boards/{id})": select(Board).where(Board.id == "b", Board.owner_id == owner),
+        "payer by stripe customer (webhook)": select(UserInfo).where(UserInfo.stripe_customer_id == "cus_123"),
+        "expired PRO (pro_status.expire_pro)": select(UserInfo.internal_id).where(
+            UserInfo.pro_expires_at < datetime(2026, 1, 1)),
+    }
+
+
+def uses_scan(plan: str, dialect: str) -> bool:
+    if dialect == "sqlite":
+        # "SCAN boards" — повний перебір; "SEARCH ... USING INDEX" — пошук по індексу;
+        # "USE TEMP B-TREE FOR ORDER BY" — сортування поза індексом
+        return any(
+            (line.startswith("SCAN") and "USING" not in line) or "TEMP B-TREE" in line
+            for line in plan.splitlines()
+        )
+    return "Seq Scan" in plan or "Sort" in plan
+
+
+async def explain_all(engine) -> bool:
+    from sqlalchemy import text
+
+    dialect = engine.dialect.name
+    ok = True
+    async with engine.connect() as conn:
+        if dialect == "postgresql":
+            await conn.execute(text("SET enable_seqscan = off"))
+        for label, stmt in queries().items():
+            sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            prefix = "EXPLAIN QUERY PLAN " if dialect == "sqlite" else "EXPLAIN "
+            rows = (await conn.execute(text(prefix + sql))).all()
+            plan = "\n".join(str(row[-1]) for row in rows)
+            scan = uses_scan(plan, dialect)
+            ok = ok and not scan
+            print(f"[{'FAIL' if scan else ' OK '}] {label}")
+            for line in plan.splitlines():
+                print(f"         {line}")
+    await engine.dispose()
+    return ok
+
+
+def main(args):
+    if not os.getenv("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="boardly-plans-"), "users.db")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+
+    from alembic import command
+    from alembic.config import Config
+
+    if not args.skip_migrate:
+        command.upgrade(Config(os.path.join(AUTH_DIR, "alembic.ini")), "head")
+
+    import database
+    ok = asyncio.run(explain_all(database.engine))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skip-migrate", action="store_true", help="база вже на head")
+    main(parser.parse_args())
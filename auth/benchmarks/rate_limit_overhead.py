@@ -0,0 +1,123 @@
+"""
+Накладні витрати ліміту запитів (dependencies.RateLimit) на один запит.
+
+1. redis_utils.hit_rate_limit напряму: час і кількість запитів до Redis
+   для одного ключа (IP) і двох (IP + email) — завжди один EVALSHA.
+2. Мінімальний FastAPI-ендпоінт із тілом {"email"} через ASGI без мережі:
+   без залежності і з RateLimit — різниця і є вартістю ліміту.
+3. Перевірка: --burst запитів з одним email за вікно — скільки отримали 429.
+
+Потрібен локальний Redis (REDIS_HOST/REDIS_PORT) і пакет `httpx`.
+
+    cd auth && python benchmarks/rate_limit_overhead.py --rounds 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+import httpx
+import redis.asyncio
+from fastapi import Depends, FastAPI
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis_utils  # noqa: E402
+from dependencies import RateLimit  # noqa: E402
+from redis_utils import async_r  # noqa: E402
+
+round_trips = 0
+
+
+class CountingConnection(redis.asyncio.Connection):
+    async def send_packed_command(self, command, check_health=True):
+        global round_trips
+        round_trips += 1
+        return await super().send_packed_command(command, check_health)
+
+
+class EmailBody(BaseModel):
+    email: str
+
+
+def build_app(scope: str, per_identity: int) -> FastAPI:
+    app = FastAPI()
+    limit = RateLimit(scope, window=60, per_ip=10 ** 9, per_identity=per_identity,
+                      identity=lambda body: body.get("email"))
+
+    @app.post("/plain")
+    async def plain(body: EmailBody):
+        return {"ok": True}
+
+    @app.post("/limited", dependencies=[Depends(limit)])
+    async def limited(body: EmailBody):
+        return {"ok": True}
+
+    return app
+
+
+async def direct(rounds: int, scope: str):
+    global round_trips
+    email = f"{uuid.uuid4()}@boardly.app"
+    variants = {
+        "1 key (ip)": {redis_utils.rate_limit_key(scope, "ip", "127.0.0.1"): 10 ** 9},
+        "2 keys (ip+email)": {redis_utils.rate_limit_key(scope, "ip", "127.0.0.1"): 10 ** 9,
+                              redis_utils.rate_limit_key(scope, "id", email): 10 ** 9},
+    }
+    for label, limits in variants.items():
+        await redis_utils.hit_rate_limit(limits, 60)  # прогрів: SCRIPT LOAD для EVALSHA
+        round_trips = 0
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await redis_utils.hit_rate_limit(limits, 60)
+        elapsed = time.perf_counter() - started
+        print(f"hit_rate_limit {label:<18} {round_trips / rounds:4.1f} round-trips  {elapsed / rounds * 1e6:8.1f}us/op")
+
+
+async def endpoint(rounds: int, scope: str):
+    transport = httpx.ASGITransport(app=build_app(scope, per_identity=10 ** 9))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results = {}
+        for path in ("/plain", "/limited"):
+            body = {"email": f"{uuid.uuid4()}@boardly.app"}
+            await client.post(path, json=body)
+            started = time.perf_counter()
+            for _ in range(rounds):
+                resp = await client.post(path, json=body)
+                assert resp.status_code == 200, resp.text
+            results[path] = (time.perf_counter() - started) / rounds * 1e6
+            print(f"POST {path:<9} {results[path]:8.1f}us/request")
+        print(f"limiter overhead: {results['/limited'] - results['/plain']:.1f}us/request")
+
+
+async def burst(requests: int, per_identity: int, scope: str):
+    transport = httpx.ASGITransport(app=build_app(scope, per_identity=per_identity))
+    body = {"email": f"{uuid.uuid4()}@boardly.app"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        responses = await asyncio.gather(*(client.post("/limited", json=body) for _ in range(requests)))
+    codes = [r.status_code for r in responses]
+    retry_after = next((r.headers["Retry-After"] for r in responses if r.status_code == 429), None)
+    print(f"burst: {requests} requests, limit {per_identity}/60s -> "
+          f"{codes.count(200)} ok, {codes.count(429)} x 429 (Retry-After={retry_after}s)")
+
+
+async def main(args):
+    redis_utils.pool.connection_class = CountingConnection
+    scope = f"bench-{uuid.uuid4().hex[:8]}"
+    await direct(args.rounds, scope)
+    await endpoint(args.rounds, scope)
+    await burst(args.burst, per_identity=5, scope=scope)
+    keys = [key async for key in async_r.scan_iter(redis_utils.rate_limit_key(scope, "*", "*"))]
+    if keys:
+        await async_r.delete(*keys)
+    await redis_utils.close_async_redis()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--burst", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,59 @@
+"""
+Перевірка ключів для Redis Cluster: Lua-скрипт або MULTI, що зачіпає кілька
+ключів, у кластері падає з CROSSSLOT, якщо ключі в різних слотах. Для кожної
+такої операції redis_utils ключі будуються тими ж хелперами, що й у коді,
+і рахується їхній слот (CRC16 з хеш-тегом, як у кластера).
+
+Redis не потрібен. Код виходу 1, якщо хоч одна операція розкидана по слотах.
+
+    cd auth && python benchmarks/redis_cluster_slots.py
+"""
+import argparse
+import os
+import sys
+import uuid
+
+from redis.crc import key_slot
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AUTH_DIR)
+
+import redis_utils  # noqa: E402
+
+
+def operations(email: str, user_id: str, devices: list[str]) -> dict[str, list[str]]:
+    return {
+        "_sliding_window (RateLimit)": [
+            redis_utils.rate_limit_key("login", "ip", "127.0.0.1"),
+            redis_utils.rate_limit_key("login", "id", email),
+        ],
+        "_login_precheck": [redis_utils._attempts_key(email), redis_utils._code_key(email)],
+        "_rotate_refresh": [redis_utils._refresh_key(user_id, devices[0]), redis_utils._devices_key(user_id)],
+        "store_refresh_token (MULTI)": [redis_utils._refresh_key(user_id, devices[0]), redis_utils._devices_key(user_id)],
+        "revoke_all_refresh_tokens (WATCH/MULTI)": [
+            redis_utils._devices_key(user_id),
+            *(redis_utils._refresh_key(user_id, device_id) for device_id in devices),
+        ],
+    }
+
+
+def main(args):
+    ok = True
+    for _ in range(args.samples):
+        email, user_id = f"{uuid.uuid4().hex[:8]}@boardly.app", str(uuid.uuid4())
+        devices = [str(uuid.uuid4()) for _ in range(3)]
+        for label, keys in operations(email, user_id, devices).items():
+            slots = {key_slot(key.encode()) for key in keys}
+            if len(slots) > 1:
+                ok = False
+                print(f"[FAIL] {label}: {len(keys)} keys in slots {sorted(slots)}")
+    if ok:
+        for label in operations("a@boardly.app", "u", ["d"]):
+            print(f"[ OK ] {label}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=100, help="скільки випадкових email/user_id перевірити")
+    main(parser.parse_args())
@@ -0,0 +1,123 @@
+"""
+Кількість мережевих запитів до Redis і час на вхід / оновлення токена.
+
+"before" повторює колишню послідовність окремих команд із auth_routes
+(check_login_attempts, get_code, reset_login_attempt, store_refresh_token;
+is_refresh_token_valid, revoke, store), "after" — нові хелпери redis_utils
+з Lua-скриптами та пайплайнами (для входу — разом із лімітом login_limit за IP).
+Запити рахуються на рівні з'єднання пулу:
+пайплайн або EVALSHA — це один запит.
+
+Наприкінці — перевірка гонки: --racers одночасних /refresh з тим самим
+токеном (має пройти рівно один) і відкликання всіх пристроїв користувача.
+
+Потрібен локальний Redis (REDIS_HOST/REDIS_PORT).
+
+    cd auth && python benchmarks/redis_round_trips.py --rounds 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import timedelta
+
+import redis.asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis_utils  # noqa: E402
+from redis_utils import async_r  # noqa: E402
+
+TTL = 30 * 24 * 3600
+round_trips = 0
+
+
+class CountingConnection(redis.asyncio.Connection):
+    async def send_packed_command(self, command, check_health=True):
+        global round_trips
+        round_trips += 1
+        return await super().send_packed_command(command, check_health)
+
+
+async def login_before(email, user_id):
+    count = await async_r.get(redis_utils._attempts_key(email))
+    if count and int(count) >= redis_utils.MAX_LOGIN_ATTEMPTS:
+        raise RuntimeError("locked")
+    await async_r.get(redis_utils._code_key(email))
+    await async_r.delete(redis_utils._attempts_key(email))
+    await async_r.setex(redis_utils._refresh_key(user_id, "dev"), timedelta(seconds=TTL), "jti-1")
+
+
+async def login_after(email, user_id):
+    # Ліміт без обмеження кількості: рахуємо лише запити, а не 429
+    await redis_utils.hit_rate_limit({redis_utils.rate_limit_key("bench", "ip", "127.0.0.1"): 10 ** 9}, 300)
+    await redis_utils.check_attempts_and_get_code(email)
+    await redis_utils.complete_login(email, user_id, "dev", "jti-1", TTL)
+
+
+async def refresh_before(user_id):
+    key = redis_utils._refresh_key(user_id, "dev")
+    stored = await async_r.get(key)
+    assert stored == "jti-1"
+    await async_r.delete(key)
+    await async_r.setex(key, timedelta(seconds=TTL), "jti-1")
+
+
+async def refresh_after(user_id):
+    assert await redis_utils.rotate_refresh_token(user_id, "dev", "jti-1", "jti-1", TTL)
+
+
+async def measure(label, flow, rounds):
+    global round_trips
+    email, user_id = f"bench-{uuid.uuid4()}@boardly.app", str(uuid.uuid4())
+    await redis_utils.store_code(email, 123456)
+    await login_after(email, user_id)  # прогрів: SCRIPT LOAD для EVALSHA
+    round_trips = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await flow(email, user_id)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<16} {round_trips / rounds:4.1f} round-trips/op  {elapsed / rounds * 1e6:8.1f}us/op")
+    # Ключі в різних слотах — кожен окремою командою
+    pipe = async_r.pipeline(transaction=False)
+    for key in (redis_utils._attempts_key(email), redis_utils._code_key(email),
+                redis_utils._refresh_key(user_id, "dev"), redis_utils._devices_key(user_id)):
+        pipe.delete(key)
+    await pipe.execute()
+
+
+async def race_and_revoke(racers: int, devices: int):
+    global round_trips
+    user_id = str(uuid.uuid4())
+    for i in range(devices):
+        await redis_utils.store_refresh_token(user_id, f"dev-{i}", "jti-1", TTL)
+
+    rotated = await asyncio.gather(*(
+        redis_utils.rotate_refresh_token(user_id, "dev-0", "jti-1", f"jti-{n}", TTL) for n in range(racers)
+    ))
+    print(f"{racers} concurrent refreshes with one token: {sum(rotated)} succeeded")
+
+    round_trips = 0
+    revoked = await redis_utils.revoke_all_refresh_tokens(user_id)
+    revoke_trips = round_trips
+    left = [key async for key in async_r.scan_iter(redis_utils._refresh_key(user_id, "*"))]
+    print(f"revoke all: {revoked} devices in {revoke_trips} round-trip(s), {len(left)} tokens left")
+
+
+async def main(args):
+    redis_utils.pool.connection_class = CountingConnection
+    await measure("login  before", login_before, args.rounds)
+    await measure("login  after", login_after, args.rounds)
+    await measure("refresh before", lambda _e, u: refresh_before(u), args.rounds)
+    await measure("refresh after", lambda _e, u: refresh_after(u), args.rounds)
+    await race_and_revoke(args.racers, devices=5)
+    await redis_utils.close_async_redis()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--racers", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
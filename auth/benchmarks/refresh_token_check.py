@@ -0,0 +1,76 @@
+"""
+Перевірка POST /auth/refresh на чужих токенах: access-токен, refresh без jti
+(auth.create_refresh_token) і токен без sub мають отримати 401, а не 500.
+Наостанок — звичайна ротація: перший запит 200, повтор того ж токена 401.
+
+Потрібен Redis (REDIS_HOST/REDIS_PORT); база — тимчасовий SQLite.
+Код виходу 1, якщо хоч одна відповідь не та.
+
+    cd auth && python benchmarks/refresh_token_check.py
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import uuid
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AUTH_DIR)
+
+
+async def seed_user() -> str:
+    from database import AsyncSessionLocal
+    from models import UserInfo
+
+    user_id = str(uuid.uuid4())
+    async with AsyncSessionLocal() as db:
+        db.add(UserInfo(internal_id=user_id, email=f"refresh-{user_id[:8]}@boardly.app", username="refresh",
+                        hashed_password="-"))
+        await db.commit()
+    return user_id
+
+
+async def main() -> bool:
+    import httpx
+    import jwt
+    import main
+    from auth import create_access_token, create_refresh_token
+    from config import ALGORITHM, REFRESH_EXPIRE_DAYS, SECRET_KEY
+    from database import engine
+    from redis_utils import close_async_redis, store_refresh_token
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    user_id = await seed_user()
+    jti = str(uuid.uuid4())
+    await store_refresh_token(user_id, "check", jti, REFRESH_EXPIRE_DAYS * 24 * 3600)
+    valid = jwt.encode({"sub": user_id, "jti": jti}, SECRET_KEY, algorithm=ALGORITHM)
+
+    cases = [
+        ("access token", create_access_token(user_id), 401),
+        ("refresh token without jti", create_refresh_token(user_id), 401),
+        ("token without sub", jwt.encode({"jti": jti}, SECRET_KEY, algorithm=ALGORITHM), 401),
+        ("valid refresh token", valid, 200),
+        ("same token again", valid, 401),
+    ]
+    ok = True
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://check") as client:
+        for label, token, expected in cases:
+            resp = await client.post("/auth/refresh", json={"refresh_token": token, "device_id": "check"})
+            passed = resp.status_code == expected
+            ok = ok and passed
+            print(f"[{' OK ' if passed else 'FAIL'}] {label}: {resp.status_code} (expected {expected})")
+    await engine.dispose()
+    await close_async_redis()
+    return ok
+
+
+if __name__ == "__main__":
+    if not os.getenv("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="boardly-refresh-"), "users.db")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    from alembic import command
+    from alembic.config import Config
+    command.upgrade(Config(os.path.join(AUTH_DIR, "alembic.ini")), "head")
+
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,192 @@
+"""
+Виклики Stripe з роутів оплати проти локального mock-сервера: затримка
+event loop, кількість TCP-з'єднань, кеш Checkout.Session і circuit breaker.
+
+"before" — синхронний SDK (stripe.checkout.Session.retrieve прямо в async
+обробнику, як було в payment_success): кожен виклик зупиняє event loop на час
+запиту. "after" — stripe_client.stripe_gateway: StripeClient + HTTPXClient,
+спільний keep-alive пул і кеш сесій.
+
+Без --api-base піднімається вбудований mock (uvicorn у потоці, --latency мс
+на запит). З --api-base http://localhost:12111 — офіційний stripe-mock
+(тоді рахунок з'єднань і перевірка breaker пропускаються).
+
+    cd auth && python benchmarks/stripe_client_mock.py --requests 200 --concurrency 20 --latency 50
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AUTH_DIR)
+
+
+class MockStripe:
+    """Мінімальний Stripe API: ті чотири виклики, що роблять роути оплати."""
+
+    def __init__(self, latency_ms: float):
+        from fastapi import FastAPI, Request
+        from fastapi.responses import JSONResponse
+
+        self.latency = latency_ms / 1000
+        self.fail = False
+        self.peers: set = set()
+        self.requests = 0
+        app = FastAPI()
+
+        @app.middleware("http")
+        async def simulate(request: Request, call_next):
+            # Порт клієнта однаковий, поки з'єднання перевикористовується
+            self.peers.add((request.client.host, request.client.port))
+            self.requests += 1
+            await asyncio.sleep(self.latency)
+            if self.fail:
+                return JSONResponse({"error": {"type": "api_error", "message": "mock outage"}}, status_code=500)
+            return await call_next(request)
+
+        @app.post("/v1/customers")
+        async def create_customer():
+            return {"id": f"cus_{uuid.uuid4().hex[:14]}", "object": "customer"}
+
+        @app.post("/v1/checkout/sessions")
+        async def create_session():
+            session_id = f"cs_test_{uuid.uuid4().hex[:24]}"
+            return {"id": session_id, "object": "checkout.session", "payment_status": "unpaid",
+                    "url": f"https://checkout.stripe.com/c/pay/{session_id}"}
+
+        @app.get("/v1/checkout/sessions/{session_id}")
+        async def retrieve_session(session_id: str):
+            return {"id": session_id, "object": "checkout.session", "payment_status": "paid",
+                    "mode": "payment", "metadata": {}}
+
+        @app.post("/v1/subscriptions/{subscription_id}")
+        async def modify_subscription(subscription_id: str):
+            return {"id": subscription_id, "object": "subscription", "cancel_at_period_end": True}
+
+        self.app = app
+
+    def start(self) -> str:
+        import uvicorn
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=self.server.run, daemon=True).start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return f"http://127.0.0.1:{port}"
+
+    def reset(self):
+        self.peers.clear()
+        self.requests = 0
+
+
+async def loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    # Наскільки пізніше за розклад прокидається задача — те, що відчувають інші запити процесу
+    worst = 0.0
+    while not stop.is_set():
+        planned = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - planned)
+    return worst
+
+
+async def measure(call, session_ids: list[str], concurrency: int) -> tuple[float, float]:
+    stop = asyncio.Event()
+    lag = asyncio.create_task(loop_lag(stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(session_id):
+        async with semaphore:
+            await call(session_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(session_id) for session_id in session_ids))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return elapsed, await lag
+
+
+def report(label: str, count: int, elapsed: float, lag: float, mock):
+    connections = f", {len(mock.peers)} TCP connections for {mock.requests} requests" if mock else ""
+    print(f"{label:<14} {count / elapsed:7.0f} req/s, max loop lag {lag * 1000:7.1f}ms{connections}")
+
+
+async def run(args, mock):
+    import stripe
+    from stripe_client import CircuitBreaker, StripeUnavailable, stripe_gateway
+
+    session_ids = [f"cs_test_{uuid.uuid4().hex[:24]}" for _ in range(args.requests)]
+
+    # before: синхронний SDK у async-обробнику
+    async def sync_retrieve(session_id):
+        stripe.checkout.Session.retrieve(session_id)
+
+    stripe.api_key, stripe.api_base, stripe.max_network_retries = "sk_test_mock", args.api_base, 0
+    if mock:
+        mock.reset()
+    report("before (sync)", args.requests, *await measure(sync_retrieve, session_ids, args.concurrency), mock)
+
+    # after: асинхронний клієнт, кеш порожній
+    if mock:
+        mock.reset()
+    report("after (miss)", args.requests,
+           *await measure(stripe_gateway.retrieve_checkout_session, session_ids, args.concurrency), mock)
+
+    # after: оновлення сторінки /success — ті самі сесії з кешу
+    if mock:
+        mock.reset()
+    report("after (hit)", args.requests,
+           *await measure(stripe_gateway.retrieve_checkout_session, session_ids, args.concurrency), mock)
+
+    # Решта викликів роутів — щоб переконатися, що mock і SDK розуміють одне одного
+    customer = await stripe_gateway.create_customer(email="mock@boardly.app", metadata={"user_internal_id": "u1"})
+    session = await stripe_gateway.create_checkout_session(customer=customer.id, mode="payment")
+    subscription = await stripe_gateway.modify_subscription("sub_mock", cancel_at_period_end=True)
+    print(f"calls          customer={customer.id} checkout={session.url is not None} "
+          f"cancel_at_period_end={subscription.cancel_at_period_end}")
+
+    if mock:
+        # Збій Stripe: після STRIPE_BREAKER_FAILURES помилок поспіль запити не йдуть у мережу
+        mock.fail, mock.requests = True, 0
+        stripe_gateway.breaker = CircuitBreaker(failures=args.breaker_failures, reset=60)
+        rejected, started = 0, time.perf_counter()
+        for _ in range(args.requests):
+            try:
+                await stripe_gateway.create_customer(email="mock@boardly.app")
+            except StripeUnavailable:
+                rejected += 1
+            except stripe.StripeError:
+                pass
+        elapsed = time.perf_counter() - started
+        print(f"outage         {args.requests} calls in {elapsed * 1000:.0f}ms: {mock.requests} reached Stripe, "
+              f"{rejected} rejected by breaker ({stripe_gateway.breaker.state})")
+
+    print(f"metrics        {stripe_gateway.metrics()}")
+    await stripe_gateway.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=50, help="мс на запит у вбудованому mock")
+    parser.add_argument("--api-base", help="зовнішній mock, напр. http://localhost:12111 (stripe-mock)")
+    parser.add_argument("--breaker-failures", type=int, default=5)
+    args = parser.parse_args()
+
+    mock = None
+    if not args.api_base:
+        mock = MockStripe(args.latency)
+        args.api_base = mock.start()
+    # Повтори вимкнено, щоб рахувати саме запити роутів
+    os.environ["STRIPE_API_BASE"] = args.api_base
+    os.environ.setdefault("STRIPE_MAX_RETRIES", "0")
+
+    asyncio.run(run(args, mock))
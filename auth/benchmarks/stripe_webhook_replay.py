@@ -0,0 +1,248 @@
+"""
+Програвання вебхуків Stripe через /auth/payment/webhook: затримка відповіді
+Stripe, пропускна здатність воркера і перевірка, що кожна оплата
+зарахована рівно один раз.
+
+Події — записані payload'и (--events, JSONL: по одній події Stripe на рядок,
+напр. з `stripe listen --print-json`) або синтетичні: --sessions подарунків
+(mode=payment, +30 днів PRO) для випадкових із --users користувачів. Кожна
+подія доставляється --deliveries разів (повтори Stripe), і для кожної сесії
+ще приходить /success — як у реальному житті.
+
+"before" — колишня обробка в самому вебхуку (activate + commit до відповіді,
+без дедуплікації), "after" — stripe_events: запис у чергу і фоновий воркер.
+Підпис рахується з STRIPE_WEBHOOK_SECRET, база — тимчасовий SQLite після
+`alembic upgrade head`.
+
+    cd auth && python benchmarks/stripe_webhook_replay.py --sessions 300 --deliveries 2
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AUTH_DIR)
+
+
+def sign(payload: bytes, secret: str) -> str:
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def synthetic_events(user_ids: list[str], sessions: int) -> list[dict]:
+    events = []
+    for _ in range(sessions):
+        beneficiaries = random.sample(user_ids, k=random.randint(1, 3))
+        events.append({
+            "id": f"evt_{uuid.uuid4().hex[:24]}",
+            "type": "checkout.session.completed",
+            "data": {"object": {
+                "id": f"cs_test_{uuid.uuid4().hex[:24]}",
+                "object": "checkout.session",
+                "mode": "payment",
+                "payment_status": "paid",
+                "customer": f"cus_{uuid.uuid4().hex[:14]}",
+                "subscription": None,
+                "metadata": {"beneficiaries": ",".join(beneficiaries)},
+            }},
+        })
+    return events
+
+
+def expected_credits(events: list[dict]) -> Counter:
+    # Одна унікальна сесія = +30 днів кожному отримувачу
+    credits, seen = Counter(), set()
+    for event in events:
+        session = event["data"]["object"]
+        if event["type"] != "checkout.session.completed" or session["id"] in seen:
+            continue
+        seen.add(session["id"])
+        beneficiaries = (session.get("metadata") or {}).get("beneficiaries", "")
+        credits.update(filter(None, beneficiaries.split(",")))
+    return credits
+
+
+async def seed_users(count: int, known_ids: set[str]) -> list[str]:
+    # known_ids — отримувачі із записаних подій, щоб їм було що зараховувати
+    from database import AsyncSessionLocal
+    from models import UserInfo
+
+    ids = [*known_ids, *(str(uuid.uuid4()) for _ in range(max(0, count - len(known_ids))))]
+    async with AsyncSessionLocal() as db:
+        users = [UserInfo(internal_id=user_id, email=f"replay{i}@boardly.app", username=f"replay{i}", hashed_password="-")
+                 for i, user_id in enumerate(ids)]
+        db.add_all(users)
+        await db.commit()
+        return [user.internal_id for user in users]
+
+
+async def reset_users():
+    from sqlalchemy import delete, update
+    from database import AsyncSessionLocal
+    from models import StripeEvent, UserInfo
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(UserInfo).values(is_pro=False, pro_expires_at=None))
+        await db.execute(delete(StripeEvent))
+        await db.commit()
+
+
+async def credited(started: datetime) -> Counter:
+    from sqlalchemy import select
+    from database import AsyncSessionLocal
+    from models import UserInfo
+
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(UserInfo.internal_id, UserInfo.pro_expires_at)
+                                 .where(UserInfo.pro_expires_at.is_not(None)))).all()
+    return Counter({user_id: round((expires - started) / timedelta(days=30)) for user_id, expires in rows})
+
+
+def deliveries(events: list[dict], times: int) -> list[dict]:
+    schedule = [event for event in events for _ in range(times)]
+    random.shuffle(schedule)
+    return schedule
+
+
+def mount_inline_webhook(app):
+    # Колишній вебхук: перевірка підпису, активація і commit — до відповіді, без дедуплікації
+    import config
+    import stripe
+    from fastapi import Depends, Request
+    from database import get_db
+    from routes import payment_routes
+
+    @app.post("/replay/inline-webhook")
+    async def inline_webhook(request: Request, db=Depends(get_db)):
+        payload = await request.body()
+        event = stripe.Webhook.construct_event(payload, request.headers["stripe-signature"],
+                                               config.STRIPE_WEBHOOK_SECRET)
+        if event["type"] == "checkout.session.completed":
+            await payment_routes.activate_pro_subscription(json.loads(payload)["data"]["object"], db)
+            await db.commit()
+        return {"status": "success"}
+
+
+async def post_all(path: str, schedule: list[dict]) -> tuple[list[float], Counter]:
+    import config
+    import main
+
+    latencies, statuses = [], Counter()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+        for event in schedule:
+            payload = json.dumps(event).encode()
+            sent = time.perf_counter()
+            resp = await client.post(path, content=payload,
+                                     headers={"Stripe-Signature": sign(payload, config.STRIPE_WEBHOOK_SECRET)})
+            latencies.append(time.perf_counter() - sent)
+            statuses[resp.json().get("status")] += 1
+    return latencies, statuses
+
+
+async def run_before(schedule: list[dict]) -> list[float]:
+    import main
+
+    mount_inline_webhook(main.app)
+    latencies, _ = await post_all("/replay/inline-webhook", schedule)
+    return latencies
+
+
+async def run_after(schedule: list[dict], events: list[dict]) -> tuple[list[float], float, dict]:
+    import stripe_events
+    from database import AsyncSessionLocal
+
+    worker = stripe_events.stripe_event_worker
+    await worker.start()
+    started = time.perf_counter()
+    latencies, statuses = await post_all("/auth/payment/webhook", schedule)
+
+    # /success для кожної сесії — те, що робить payment_success після Session.retrieve
+    async with AsyncSessionLocal() as db:
+        for event in events:
+            session = event["data"]["object"]
+            await stripe_events.enqueue_event(db, {
+                "id": f"success:{session['id']}", "type": event["type"], "data": {"object": session},
+            })
+
+    while True:
+        queue = (await worker.metrics())["queue"]
+        if not queue.get("pending") and not queue.get("processing"):
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await worker.stop()
+    return latencies, elapsed, {**worker.stats, "responses": dict(statuses), "queue": queue}
+
+
+def report(label: str, latencies: list[float]):
+    lat = sorted(latencies)
+    p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))]
+    print(f"{label:<7} ack p50={statistics.median(lat) * 1000:6.2f}ms p99={p99 * 1000:6.2f}ms  ({len(lat)} deliveries)")
+
+
+def check(label: str, got: Counter, expected: Counter):
+    over = sum(max(0, got[u] - expected[u]) for u in expected | got)
+    under = sum(max(0, expected[u] - got[u]) for u in expected)
+    print(f"{label:<7} credits: expected {sum(expected.values())}, over-credited {over}, missing {under}")
+
+
+async def main(args):
+    from database import engine
+
+    events = []
+    if args.events:
+        with open(args.events) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    expected = expected_credits(events)
+    user_ids = await seed_users(args.users, set(expected))
+    if not events:
+        events = synthetic_events(user_ids, args.sessions)
+        expected = expected_credits(events)
+    schedule = deliveries(events, args.deliveries)
+
+    started = datetime.utcnow()
+    report("before", await run_before(schedule))
+    check("before", await credited(started), expected)
+
+    await reset_users()
+    started = datetime.utcnow()
+    latencies, elapsed, stats = await run_after(schedule, events)
+    report("after", latencies)
+    print(f"after   worker: {stats['processed']} processed in {stats['batches']} batches, "
+          f"{stats['duplicates']} duplicates dropped, {(len(schedule) + len(events)) / elapsed:.0f} deliveries/s end-to-end")
+    print(f"after   responses: {stats['responses']} queue: {stats['queue']}")
+    check("after", await credited(started), expected)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", help="JSONL із записаними подіями Stripe")
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--deliveries", type=int, default=2, help="скільки разів доставляється кожна подія")
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(prefix="boardly-stripe-"), "users.db")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    from alembic import command
+    from alembic.config import Config
+    command.upgrade(Config(os.path.join(AUTH_DIR, "alembic.ini")), "head")
+
+    asyncio.run(main(args))
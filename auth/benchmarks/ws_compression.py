@@ -0,0 +1,87 @@
+"""
+Компроміс трафік/CPU для стиснення кадрів на типових знімках дошки.
+
+Генерує full-board повідомлення (формат BoardModel/BoardItem з клієнта)
+різного розміру і для кожного рівня zlib показує розмір, ступінь стиснення
+та час стиснення/розпакування. Також показує, що кадри менші за
+WS_COMPRESS_MIN_BYTES стискати невигідно.
+
+    cd auth && python benchmarks/ws_compression.py
+"""
+import os
+import random
+import sys
+import time
+import uuid
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ws_codec  # noqa: E402
+
+EXTENSIONS = ["pdf", "png", "docx", "mp4", "txt", "py", "xlsx", "jpg"]
+
+
+def make_item(rng: random.Random) -> dict:
+    ext = rng.choice(EXTENSIONS)
+    name = f"file_{rng.randint(1, 9999)}.{ext}"
+    path = f"C:/Users/user/Boardly/boards/{uuid.UUID(int=rng.getrandbits(128))}/{name}"
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "path": path,
+        "position": {"dx": rng.uniform(-4000, 4000), "dy": rng.uniform(-4000, 4000)},
+        "type": ext,
+        "tags": rng.sample(["work", "draft", "final", "todo", "design"], k=rng.randint(0, 2)),
+        "notes": None if rng.random() < 0.6 else "Нотатка до файлу " * rng.randint(1, 5),
+        "connectionId": None,
+        "fileName": name,
+        "shortcutPath": None,
+        "originalPath": path,
+    }
+
+
+def make_snapshot(items: int, seed: int = 42) -> str:
+    rng = random.Random(seed)
+    board = {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "title": "Project board",
+        "ownerId": str(uuid.UUID(int=rng.getrandbits(128))),
+        "items": [make_item(rng) for _ in range(items)],
+        "connections": [],
+        "links": [],
+        "connectionBoards": [],
+        "isConnectionBoard": False,
+        "connectionId": None,
+        "description": "",
+        "isJoined": False,
+        "blockedPublicIds": [],
+    }
+    # full-board несе дошку як JSON-рядок усередині JSON (див. rtc.dart)
+    return ws_codec.dumps({"type": "full-board", "from": str(uuid.uuid4()), "board": ws_codec.dumps(board)})
+
+
+def measure(frame: str, level: int, rounds: int):
+    raw = frame.encode("utf-8")
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        packed = c.compress(raw) + c.flush()
+    comp = (time.perf_counter() - t0) / rounds
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        zlib.decompress(packed, -zlib.MAX_WBITS)
+    decomp = (time.perf_counter() - t0) / rounds
+    return len(packed), comp, decomp
+
+
+if __name__ == "__main__":
+    print(f"threshold WS_COMPRESS_MIN_BYTES={ws_codec.WS_COMPRESS_MIN_BYTES}")
+    print(f"{'items':>6} {'raw':>10} {'lvl':>4} {'packed':>10} {'ratio':>6} {'compress':>10} {'inflate':>9} {'MB/s':>7}")
+    for items in (1, 10, 100, 1000, 5000):
+        frame = make_snapshot(items)
+        rounds = max(3, 2000 // items)
+        for level in (1, 6, 9):
+            size, comp, decomp = measure(frame, level, rounds)
+            raw = len(frame.encode("utf-8"))
+            print(f"{items:>6} {raw:>10,} {level:>4} {size:>10,} {raw / size:>5.1f}x "
+                  f"{comp * 1e3:>8.2f}ms {decomp * 1e3:>7.2f}ms {raw / comp / 1e6:>7.1f}")
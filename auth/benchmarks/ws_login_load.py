@@ -0,0 +1,138 @@
+"""
+Затримка ретрансляції /ws, поки /auth/login під навантаженням.
+
+Піднімає uvicorn (один воркер) на тимчасовій SQLite-базі, створює тестового
+користувача і код підтвердження, а далі двоє пірів ганяють ping-pong через
+релей. Затримка міряється спершу без навантаження, потім паралельно з
+--logins одночасними клієнтами, що безперервно логіняться. Усе, що блокує
+event loop у login (запити до БД, хешування пароля), видно в p99 релею.
+
+Потрібен локальний Redis (REDIS_HOST/REDIS_PORT), пакети `websockets` і `httpx`.
+
+    cd auth && python benchmarks/ws_login_load.py --logins 20 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EMAIL = "load_test@boardly.app"
+PASSWORD = "LoadTestPassword123!"
+CODE = "424242"
+
+
+async def seed(database_url: str):
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, AUTH_DIR)
+    import database
+    from auth import hash_password
+    from models import UserInfo
+    from redis_utils import store_code
+
+    async with database.engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    async with database.AsyncSessionLocal() as db:
+        db.add(UserInfo(email=EMAIL, username="LoadTest", hashed_password=hash_password(PASSWORD), is_confirmed=True))
+        await db.commit()
+    await database.engine.dispose()
+    await store_code(EMAIL, CODE, expires_in=3600)
+
+
+async def wait_ready(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+async def ping_pong(port: int, seconds: float) -> list[float]:
+    url = f"ws://127.0.0.1:{port}/ws/login-load-{time.time_ns()}"
+    latencies = []
+    async with websockets.connect(url) as a, websockets.connect(url) as b:
+        json.loads(await a.recv())
+        json.loads(await b.recv())
+
+        async def echo():
+            while True:
+                data = json.loads(await b.recv())
+                if data.get("type") == "bench":
+                    await b.send(json.dumps({"type": "bench-ack", "sent": data["sent"]}))
+
+        echo_task = asyncio.create_task(echo())
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            await a.send(json.dumps({"type": "bench", "sent": time.perf_counter()}))
+            while True:
+                data = json.loads(await a.recv())
+                if data.get("type") == "bench-ack":
+                    latencies.append(time.perf_counter() - data["sent"])
+                    break
+            await asyncio.sleep(0.005)
+        echo_task.cancel()
+    return sorted(latencies)
+
+
+async def login_loop(port: int, stop: asyncio.Event, counts: dict):
+    body = {"data": {"email": EMAIL, "password": PASSWORD, "email_code": CODE}, "device_id": "load-test"}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+        while not stop.is_set():
+            resp = await client.post("/auth/login", json=body)
+            counts[resp.status_code] = counts.get(resp.status_code, 0) + 1
+
+
+def report(label: str, lat: list[float]):
+    p = lambda q: lat[min(len(lat) - 1, int(len(lat) * q))] * 1000  # noqa: E731
+    print(f"{label:<14} n={len(lat):>5} p50={statistics.median(lat) * 1000:7.2f}ms "
+          f"p99={p(0.99):7.2f}ms max={lat[-1] * 1000:7.2f}ms")
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="boardly-load-")
+    database_url = f"sqlite+aiosqlite:///{os.path.join(workdir, 'users.db')}"
+    await seed(database_url)
+
+    # Усі клієнти логіняться одним email з одного IP — ліміти вимикаємо
+    env = dict(os.environ, DATABASE_URL=database_url, RATE_LIMIT_ENABLED="false")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=AUTH_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        await wait_ready(args.port)
+        report("idle", await ping_pong(args.port, args.seconds))
+
+        stop, counts = asyncio.Event(), {}
+        logins = [asyncio.create_task(login_loop(args.port, stop, counts)) for _ in range(args.logins)]
+        await asyncio.sleep(0.5)
+        lat = await ping_pong(args.port, args.seconds)
+        stop.set()
+        await asyncio.gather(*logins)
+        report(f"logins={args.logins}", lat)
+        total = sum(counts.values())
+        print(f"login responses: {counts} ({total / (args.seconds + 0.5):.1f} req/s)")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=20, help="одночасних клієнтів /auth/login")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8300)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,120 @@
+"""
+Навантажувальний тест сигналінгу на кількох воркерах через Redis.
+
+Піднімає N окремих процесів uvicorn (SIGNALING_BACKEND=redis) на різних портах,
+розкидає клієнтів однієї кімнати по всіх воркерах і перевіряє, що кожен
+бродкаст доходить до всіх інших пірів, та міряє затримку доставки.
+
+Потрібен локальний Redis (REDIS_HOST/REDIS_PORT) і пакет `websockets`.
+
+    cd auth && python benchmarks/ws_multiworker_load.py --workers 4 --peers 40 --messages 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import websockets
+
+AUTH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_workers(count: int, base_port: int):
+    env = dict(os.environ, SIGNALING_BACKEND="redis")
+    procs = []
+    for i in range(count):
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(base_port + i), "--log-level", "warning"],
+            cwd=AUTH_DIR,
+            env=env,
+        ))
+    return procs
+
+
+async def wait_ready(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Worker on port {port} did not start")
+
+
+async def run_peer(port, board_id, ready, go, expected, latencies, counts, idx, messages):
+    async with websockets.connect(f"ws://127.0.0.1:{port}/ws/{board_id}") as ws:
+        hello = json.loads(await ws.recv())
+        assert hello["type"] == "connected"
+        ready.release()
+        await go.wait()
+
+        async def reader():
+            while counts[idx] < expected:
+                data = json.loads(await ws.recv())
+                if data.get("type") == "bench":
+                    latencies.append(time.perf_counter() - data["ts"])
+                    counts[idx] += 1
+
+        reader_task = asyncio.create_task(reader())
+        for n in range(messages):
+            await ws.send(json.dumps({"type": "bench", "n": n, "ts": time.perf_counter()}))
+            await asyncio.sleep(0)
+        try:
+            await asyncio.wait_for(reader_task, timeout=30)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def main(args):
+    procs = start_workers(args.workers, args.base_port)
+    try:
+        await asyncio.gather(*(wait_ready(args.base_port + i) for i in range(args.workers)))
+
+        board_id = f"bench-{int(time.time())}"
+        ready = asyncio.Semaphore(0)
+        go = asyncio.Event()
+        latencies, counts = [], [0] * args.peers
+        expected = (args.peers - 1) * args.messages
+
+        tasks = []
+        for i in range(args.peers):
+            port = args.base_port + i % args.workers
+            tasks.append(asyncio.create_task(
+                run_peer(port, board_id, ready, go, expected, latencies, counts, i, args.messages)
+            ))
+            # Послідовне підключення, щоб усі піри бачили одне одного
+            await ready.acquire()
+
+        started = time.perf_counter()
+        go.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        delivered = sum(counts)
+        print(f"workers={args.workers} peers={args.peers} messages/peer={args.messages}")
+        print(f"delivered {delivered}/{expected * args.peers} in {elapsed:.2f}s "
+              f"({delivered / elapsed:.0f} msg/s)")
+        if latencies:
+            latencies.sort()
+            print(f"latency p50={statistics.median(latencies) * 1000:.1f}ms "
+                  f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms")
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--peers", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--base-port", type=int, default=8100)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,116 @@
+"""
+Пропускна здатність ретрансляції при великій кількості одночасних кімнат.
+
+"before" — той самий ConnectionManager, але гарячий шлях бере глобальний
+asyncio.Lock на кожне повідомлення (як було раніше). "after" — поточний
+шлях без блокувань через знімки кімнат. Паралельно йде постійна зміна
+складу кімнат (connect/disconnect), яка тримає lock.
+
+Міряється лише час усередині broadcast/send_to_peer — роботу писачів
+пірів (відправку в сокет) бенчмарк не враховує.
+
+    cd auth && python benchmarks/ws_room_lookup.py --rooms 500 --peers 4 --messages 200
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from relay import ConnectionManager  # noqa: E402
+
+
+class FakeWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        pass
+
+    async def close(self, code=1000):
+        pass
+
+
+class LockedLookupManager(ConnectionManager):
+    """Стара поведінка: кожен пошук — під глобальним lock з копією складу кімнати."""
+
+    async def send_to_peer(self, board_id, to_peer_id, message):
+        async with self.lock:
+            pass
+        await super().send_to_peer(board_id, to_peer_id, message)
+
+    async def _send_local(self, board_id, frame, key=None, exclude_peer=None):
+        async with self.lock:
+            room = self.rooms.get(board_id)
+            peers = list(room.peers.items()) if room else []
+        for pid, peer in peers:
+            if pid != exclude_peer:
+                peer.enqueue(frame, key)
+
+
+async def run(manager_cls, rooms: int, peers: int, messages: int) -> float:
+    manager = manager_cls()
+    await manager.start()
+
+    members = {}
+    for r in range(rooms):
+        board_id = f"board-{r}"
+        members[board_id] = [await manager.connect(board_id, FakeWebSocket()) for _ in range(peers)]
+
+    stop = asyncio.Event()
+
+    async def churn():
+        # Постійні входи/виходи в окремій кімнаті
+        while not stop.is_set():
+            pid = await manager.connect("churn", FakeWebSocket())
+            await manager.disconnect("churn", pid)
+            await asyncio.sleep(0)
+
+    spent = []
+
+    async def relay(board_id, peer_ids):
+        sender = peer_ids[0]
+        total = 0.0
+        for n in range(messages):
+            t0 = time.perf_counter()
+            await manager.broadcast(board_id, {"type": "item-update", "from": sender, "item": {"id": "x", "n": n}},
+                                    exclude_peer=sender)
+            await manager.send_to_peer(board_id, peer_ids[-1], {"type": "candidate", "from": sender})
+            total += time.perf_counter() - t0
+            # Даємо іншим кімнатам і писачам пірів свою чергу
+            await asyncio.sleep(0)
+        spent.append(total)
+
+    churners = [asyncio.create_task(churn()) for _ in range(4)]
+    await asyncio.gather(*(relay(b, p) for b, p in members.items()))
+    stop.set()
+    await asyncio.gather(*churners)
+
+    for board_id, peer_ids in members.items():
+        for pid in peer_ids:
+            await manager.disconnect(board_id, pid)
+    await manager.stop()
+    return rooms * messages * 2 / sum(spent)
+
+
+async def main(args):
+    # Логи [CONNECT]/[DISCONNECT] менеджера тут лише заважають
+    with contextlib.redirect_stdout(io.StringIO()):
+        await run(ConnectionManager, args.rooms, args.peers, args.messages // 4)  # прогрів
+        before = await run(LockedLookupManager, args.rooms, args.peers, args.messages)
+        after = await run(ConnectionManager, args.rooms, args.peers, args.messages)
+    print(f"rooms={args.rooms} peers/room={args.peers} messages/room={args.messages * 2}")
+    print(f"before (global lock): {before:,.0f} relayed msg/s")
+    print(f"after (snapshots):    {after:,.0f} relayed msg/s ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--peers", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,55 @@
+"""
+Мікробенчмарк кодування бродкасту: старий шлях (send_json на кожного
+отримувача, stdlib json) проти нового (один ws_codec.dumps на повідомлення).
+
+    cd auth && python benchmarks/ws_serialize_once.py
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ws_codec  # noqa: E402
+
+# Типове item-update з клієнта (lib/web_rtc/rtc.dart)
+MESSAGE = {
+    "type": "item-update",
+    "from": "6f1c1f5e-8d0e-4f41-9d5a-1b2c3d4e5f60",
+    "msgId": "0e4c8a1e-2f7b-4c55-b0a1-7f9e8d6c5b4a",
+    "target": "broadcast",
+    "item": {
+        "id": "a3f0b9d2-77c1-4e0e-9a55-3c2d1e0f9b8a",
+        "type": "file",
+        "fileName": "Квартальний звіт — фінал.pdf",
+        "originalPath": "C:/Users/user/Documents/Boardly/report.pdf",
+        "position": {"dx": 1284.5, "dy": -312.25},
+        "size": {"width": 180.0, "height": 120.0},
+        "connectionId": None,
+        "notes": "Перевірити цифри " * 4,
+    },
+}
+
+ROUNDS = 2000
+
+
+def per_recipient(peers: int):
+    # Так робив ConnectionManager.broadcast: send_json => json.dumps на кожного
+    for _ in range(peers):
+        json.dumps(MESSAGE, separators=(",", ":"), ensure_ascii=False)
+
+
+def encode_once(peers: int):
+    frame = ws_codec.dumps(MESSAGE)
+    for _ in range(peers):
+        _ = frame
+
+
+if __name__ == "__main__":
+    print(f"codec: {ws_codec.CODEC_NAME}, rounds: {ROUNDS}")
+    print(f"{'peers':>5} {'per-recipient':>15} {'encode-once':>13} {'speedup':>8}")
+    for peers in (2, 10, 50):
+        old = timeit.timeit(lambda: per_recipient(peers), number=ROUNDS)
+        new = timeit.timeit(lambda: encode_once(peers), number=ROUNDS)
+        print(f"{peers:>5} {old / ROUNDS * 1e6:>12.1f} us {new / ROUNDS * 1e6:>10.1f} us {old / new:>7.1f}x")
@@ -0,0 +1,90 @@
+import asyncio
+import os
+from typing import Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import Board, UserInfo
+
+# Як часто звіряти users.board_count з фактичною кількістю дошок (сек, 0 — не звіряти)
+BOARD_COUNT_RECONCILE_INTERVAL = float(os.getenv("BOARD_COUNT_RECONCILE_INTERVAL", 3600))
+
+
+async def reconcile_board_counts(db: AsyncSession) -> int:
+    """
+    Виправляє users.board_count, що розійшовся з COUNT(*) по boards
+    (ручні правки БД, старі записи до появи лічильника). Повертає кількість
+    виправлених користувачів.
+
+    Розбіжності шукаються одним запитом, а кожен користувач виправляється
+    окремою транзакцією під блокуванням рядка: паралельний create_board
+    чекає, і перерахунок бачить уже закомічені дошки.
+    """
+    actual = (
+        select(func.count())
+        .select_from(Board)
+        .where(Board.owner_id == UserInfo.internal_id)
+        .correlate(UserInfo)
+        .scalar_subquery()
+    )
+    drifted = (await db.scalars(select(UserInfo.internal_id).where(UserInfo.board_count != actual))).all()
+    await db.commit()
+
+    repaired = 0
+    for user_id in drifted:
+        await db.scalar(select(UserInfo.internal_id).where(UserInfo.internal_id == user_id).with_for_update())
+        count = await db.scalar(select(func.count()).select_from(Board).where(Board.owner_id == user_id))
+        result = await db.execute(
+            update(UserInfo)
+            .where(UserInfo.internal_id == user_id, UserInfo.board_count != count)
+            .values(board_count=count)
+        )
+        await db.commit()
+        repaired += result.rowcount
+    return repaired
+
+
+class BoardCountReconciler:
+    """
+    Фонова звірка board_count кожні BOARD_COUNT_RECONCILE_INTERVAL секунд.
+    У кожному воркері своя — запит ідемпотентний, а розбіжності рідкісні.
+    """
+
+    def __init__(self, interval: float = BOARD_COUNT_RECONCILE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    repaired = await reconcile_board_counts(db)
+                if repaired:
+                    print(f"[BOARDS] Reconciled board_count for {repaired} users")
+            except Exception as e:
+                print(f"[BOARDS] Reconcile failed: {e}")
+
+
+board_count_reconciler = BoardCountReconciler()
+
+
+if __name__ == "__main__":
+    # Разовий запуск: python board_counts.py
+    async def _main():
+        async with AsyncSessionLocal() as db:
+            print(f"Reconciled board_count for {await reconcile_board_counts(db)} users")
+
+    asyncio.run(_main())
@@ -0,0 +1,78 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from peer_queue import coalesce_key
+
+# Вікно злиття за замовчуванням (мс). 0 — вимкнено, кімната вмикає його сама через ?coalesce_ms=
+WS_COALESCE_MS = int(os.getenv("WS_COALESCE_MS", 0))
+WS_COALESCE_MAX_MS = 100
+
+
+def clamp_window(window_ms: int | None) -> int:
+    if window_ms is None:
+        window_ms = WS_COALESCE_MS
+    return max(0, min(int(window_ms), WS_COALESCE_MAX_MS))
+
+
+class BroadcastCoalescer:
+    """
+    Злиття частих бродкастів кімнати в межах короткого вікна (16–33 мс).
+
+    За один тік пересилається лише останнє оновлення на (відправник, елемент)
+    — item-update, connection-update, курсори. Дискретні події (item-add,
+    item-delete тощо) йдуть одразу, але спершу виштовхують усе накопичене,
+    щоб порядок відносно них не порушився.
+    """
+
+    def __init__(
+        self,
+        window_ms: int,
+        emit: Callable[[dict, Optional[str]], Awaitable[None]],
+        stats: Dict[str, int],
+    ):
+        self.window = window_ms / 1000
+        self._emit = emit
+        self._stats = stats
+        self._pending: Dict[tuple, Tuple[dict, Optional[str]]] = {}
+        self._timer: asyncio.Task | None = None
+        # Не даємо дискретній події вклинитися посеред виштовхування
+        self._lock = asyncio.Lock()
+
+    async def submit(self, message: dict, exclude_peer: str | None = None):
+        key = coalesce_key(message)
+        if key is None:
+            async with self._lock:
+                await self._drain()
+                await self._emit(message, exclude_peer)
+            return
+
+        if key in self._pending:
+            self._stats["window_coalesced"] += 1
+        self._pending[key] = (message, exclude_peer)
+
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._tick())
+
+    async def submit_now(self, send: Callable[[], Awaitable[None]]):
+        """Негайна відправка в обхід вікна (напр. бінарний кадр) — після накопиченого."""
+        async with self._lock:
+            await self._drain()
+            await send()
+
+    async def _tick(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        async with self._lock:
+            await self._drain()
+
+    async def _drain(self):
+        pending, self._pending = self._pending, {}
+        for message, exclude_peer in pending.values():
+            await self._emit(message, exclude_peer)
+
+    def close(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._pending.clear()
@@ -0,0 +1,218 @@
+import ipaddress
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+import jwt
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordBearer
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import SECRET_KEY, ALGORITHM
+from database import get_db
+from models import UserInfo
+from redis_utils import hit_rate_limit, rate_limit_key
+from user_cache import CachedUser, user_cache
+
+# Вимкнення лімітів для навантажувальних тестів (benchmarks/ws_login_load.py)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Проксі (nginx, балансувальник), яким довіряємо X-Forwarded-For: IP або мережі через кому.
+# Без цього за проксі всі клієнти мали б одну адресу і один ліміт
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(net.strip(), strict=False)
+    for net in os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if net.strip()
+]
+
+# --- Схема авторизації, спільна для всіх роутів ---
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+
+
+def _credentials_exception(detail: str = "Could not validate credentials") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+class TokenClaims:
+    """
+    Вміст access-токена — лише user_id. Статус користувача (PRO, видалення)
+    береться з user_cache: у токені він застарів би до кінця його терміну.
+    """
+    __slots__ = ("user_id",)
+
+    def __init__(self, payload: dict):
+        self.user_id: str = payload["sub"]
+
+
+async def get_token_claims(token: str = Depends(oauth2_scheme)) -> TokenClaims:
+    """Лише перевірка підпису JWT — без БД. Досить там, де потрібен тільки user_id."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise _credentials_exception("Token expired")
+    except jwt.PyJWTError:
+        raise _credentials_exception()
+
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return TokenClaims(payload)
+
+
+async def load_cached_user(user_id: str, db: AsyncSession) -> Optional[CachedUser]:
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    user = await db.scalar(select(UserInfo).where(UserInfo.internal_id == user_id))
+    if user is None:
+        return None
+    cached = CachedUser.from_user(user)
+    user_cache.put(cached)
+    return cached
+
+
+async def get_cached_user(
+    claims: TokenClaims = Depends(get_token_claims),
+    db: AsyncSession = Depends(get_db),
+) -> CachedUser:
+    """
+    Користувач для маршрутів, що лише читають (/user/me, ліміти дошок).
+    У звичайному випадку береться з user_cache без запиту до БД.
+    """
+    user = await load_cached_user(claims.user_id, db)
+    if user is None:
+        raise _credentials_exception()
+    return user
+
+
+async def get_current_user(
+    claims: TokenClaims = Depends(get_token_claims),
+    db: AsyncSession = Depends(get_db),
+) -> UserInfo:
+    """
+    Повний UserInfo, прив'язаний до сесії запиту — для маршрутів, що змінюють
+    користувача. Після commit таких змін викликайте user_cache.publish_invalidation().
+    """
+    user = await db.scalar(select(UserInfo).where(UserInfo.internal_id == claims.user_id))
+    if user is None:
+        raise _credentials_exception()
+
+    # PRO з минулим терміном тут не вимикаємо: це робить pro_status.ProExpirySweeper,
+    # а до його проходу CachedUser.is_pro вже повертає False
+    user_cache.put(CachedUser.from_user(user))
+    return user
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in net for net in TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str:
+    """
+    IP клієнта: якщо запит прийшов від довіреного проксі — перша справа
+    адреса в X-Forwarded-For, яка сама не є довіреним проксі.
+    """
+    host = request.client.host if request.client else "unknown"
+    if not _is_trusted_proxy(host):
+        return host
+    forwarded = [part.strip() for part in request.headers.get("x-forwarded-for", "").split(",") if part.strip()]
+    for hop in reversed(forwarded):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return forwarded[0] if forwarded else host
+
+
+class _LocalWindow:
+    """
+    Запасний ліміт у пам'яті процесу на час недоступності Redis: те саме
+    ковзне вікно, але на воркер. Ліміти не зникають, лише діють окремо в кожному процесі.
+    """
+    MAX_KEYS = 100_000
+
+    def __init__(self):
+        self._hits: Dict[str, Deque[float]] = {}
+
+    def hit(self, limits: dict[str, int], window: int) -> int:
+        now = time.monotonic()
+        retry_after = 0.0
+        for key, limit in limits.items():
+            hits = self._hits.get(key)
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if hits and len(hits) >= limit:
+                retry_after = max(retry_after, hits[0] + window - now)
+        if retry_after:
+            return max(1, int(retry_after + 0.999))
+        if len(self._hits) > self.MAX_KEYS:
+            self._hits.clear()
+        for key in limits:
+            self._hits.setdefault(key, deque()).append(now)
+        return 0
+
+
+_local_window = _LocalWindow()
+
+
+class RateLimit:
+    """
+    Залежність FastAPI: ковзне вікно на scope за IP клієнта і, якщо задано
+    identity, ще й за значенням із тіла запиту (email, device_id).
+    Обидва ліміти перевіряються одним викликом Lua (redis_utils.hit_rate_limit);
+    при перевищенні — 429 з Retry-After. Якщо Redis недоступний, діє
+    запасний ліміт у пам'яті процесу (_LocalWindow).
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        window: int,
+        per_ip: int,
+        per_identity: Optional[int] = None,
+        identity: Optional[Callable[[dict], Optional[str]]] = None,
+    ):
+        self.scope = scope
+        self.window = window
+        self.per_ip = per_ip
+        self.per_identity = per_identity
+        self.identity = identity
+
+    async def _identity(self, request: Request) -> Optional[str]:
+        if self.identity is None:
+            return None
+        try:
+            # Starlette кешує тіло — FastAPI потім розбере його повторно без читання сокета
+            body = await request.json()
+        except ValueError:
+            return None
+        value = self.identity(body) if isinstance(body, dict) else None
+        return str(value).strip().lower() if value else None
+
+    async def __call__(self, request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        ip = client_ip(request)
+        limits = {rate_limit_key(self.scope, "ip", ip): self.per_ip}
+        identity = await self._identity(request)
+        if identity is not None:
+            limits[rate_limit_key(self.scope, "id", identity)] = self.per_identity
+
+        try:
+            retry_after = await hit_rate_limit(limits, self.window)
+        except RedisError as e:
+            print(f"[RATE] Redis unavailable, using local limiter: {e}")
+            retry_after = _local_window.hit(limits, self.window)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(retry_after)},
+            )
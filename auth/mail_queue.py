@@ -0,0 +1,286 @@
+import asyncio
+import json
+import os
+import random
+import smtplib
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from typing import Deque, List, Optional
+
+from config import SMTP_USER, SMTP_PASS, SMTP_SERVER, SMTP_PORT
+
+# ===== Налаштування черги пошти =====
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", 10000))
+# Скільки постійних SMTP-з'єднань (і потоків-відправників) тримає процес
+MAIL_SMTP_CONNECTIONS = int(os.getenv("MAIL_SMTP_CONNECTIONS", 2))
+# Листів за один прохід по з'єднанню і скільки чекати, щоб пачка набралась
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 20))
+MAIL_BATCH_WAIT_MS = int(os.getenv("MAIL_BATCH_WAIT_MS", 50))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 5))
+MAIL_RETRY_BASE = float(os.getenv("MAIL_RETRY_BASE", 2.0))  # сек, далі 2x на спробу
+MAIL_RETRY_MAX = float(os.getenv("MAIL_RETRY_MAX", 300.0))
+# З'єднання, що простояло довше, перевіряємо NOOP перед використанням
+MAIL_SMTP_IDLE_CHECK = float(os.getenv("MAIL_SMTP_IDLE_CHECK", 30.0))
+MAIL_SMTP_TIMEOUT = float(os.getenv("MAIL_SMTP_TIMEOUT", 30.0))
+# Для локального aiosmtpd без TLS — MAIL_SMTP_STARTTLS=false
+MAIL_SMTP_STARTTLS = os.getenv("MAIL_SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+# Листи, що так і не пішли, дублюються в Redis list (останні MAIL_DEAD_LETTER_MAX)
+MAIL_DEAD_LETTER_KEY = "mail:dead"
+MAIL_DEAD_LETTER_MAX = 1000
+
+
+class MailJob:
+    __slots__ = ("message", "attempts", "enqueued_at", "last_error")
+
+    def __init__(self, message: Message):
+        self.message = message
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+        self.last_error: Optional[str] = None
+
+
+class MailQueueFull(Exception):
+    pass
+
+
+def _is_permanent(error: Exception) -> bool:
+    # 5xx від сервера (невірний адресат, відмова в автентифікації) повтор не виправить
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+class SmtpConnection:
+    """
+    Одне постійне SMTP-з'єднання: ehlo/starttls/login виконуються один раз,
+    далі лише send_message. Використовується одним відправником за раз.
+    """
+
+    def __init__(self, stats: dict):
+        self._stats = stats
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        smtp = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=MAIL_SMTP_TIMEOUT)
+        smtp.ehlo()
+        if MAIL_SMTP_STARTTLS:
+            smtp.starttls()
+            smtp.ehlo()
+        if SMTP_USER and smtp.has_extn("auth"):
+            smtp.login(SMTP_USER, SMTP_PASS)
+        self._smtp = smtp
+        self._stats["connections_opened"] += 1
+
+    def _ensure(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > MAIL_SMTP_IDLE_CHECK:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self.close()
+            except smtplib.SMTPException:
+                self.close()
+            except OSError:
+                self.close()
+        if self._smtp is None:
+            self._connect()
+
+    def send_batch(self, jobs: List[MailJob]) -> List[Optional[Exception]]:
+        """Виконується в потоці. Повертає помилку (або None) для кожного листа."""
+        results: List[Optional[Exception]] = []
+        for job in jobs:
+            try:
+                self._ensure()
+                self._smtp.send_message(job.message)
+                results.append(None)
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                # З'єднання вмерло — наступний лист відкриє нове
+                self.close()
+                results.append(e)
+            except smtplib.SMTPException as e:
+                try:
+                    # Скидаємо транзакцію, щоб з'єднання лишилося придатним
+                    self._smtp.rset()
+                except Exception:
+                    self.close()
+                results.append(e)
+            self._last_used = time.monotonic()
+        return results
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+
+class MailQueue:
+    """
+    Асинхронна черга вихідної пошти процесу.
+
+    Обробники лише кладуть лист у чергу (submit) і одразу відповідають.
+    MAIL_SMTP_CONNECTIONS відправників тримають по постійному SMTP-з'єднанню,
+    збирають листи пачками до MAIL_BATCH_SIZE і шлють їх у своєму потоці.
+    Тимчасові помилки повторюються з експоненційною затримкою, а листи,
+    що вичерпали MAIL_MAX_ATTEMPTS або отримали 5xx, йдуть у dead-letter.
+    Черга живе в пам'яті: при падінні процесу невідправлені листи губляться.
+    """
+
+    def __init__(self, connections: int = MAIL_SMTP_CONNECTIONS, max_size: int = MAIL_QUEUE_SIZE):
+        self.connections = connections
+        self._queue: asyncio.Queue[MailJob] = asyncio.Queue(maxsize=max_size)
+        self._workers: List[asyncio.Task] = []
+        # Відкладені повтори та запис dead-letter у Redis
+        self._background: set[asyncio.Task] = set()
+        self._retry_pending = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.dead_letters: Deque[dict] = deque(maxlen=MAIL_DEAD_LETTER_MAX)
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self.stats = {"submitted": 0, "sent": 0, "failed_attempts": 0, "retried": 0, "dead_lettered": 0,
+                      "rejected": 0, "batches": 0, "connections_opened": 0}
+
+    async def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix="smtp")
+        for _ in range(self.connections):
+            self._workers.append(asyncio.create_task(self._worker(SmtpConnection(self.stats))))
+
+    async def stop(self, timeout: float = 10.0):
+        # Даємо дописати те, що вже в черзі, але не довше timeout
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"[MAIL] Shutdown with {self._queue.qsize()} unsent messages")
+        for task in [*self._workers, *self._background]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._background, return_exceptions=True)
+        self._workers.clear()
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+    async def drain(self):
+        """Чекає, поки черга і відкладені повтори спорожніють."""
+        while True:
+            await self._queue.join()
+            if not self._retry_pending:
+                return
+            await asyncio.sleep(0.05)
+
+    def submit(self, message: Message):
+        """Не блокує. MailQueueFull — черга переповнена."""
+        try:
+            self._queue.put_nowait(MailJob(message))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise MailQueueFull()
+        self.stats["submitted"] += 1
+
+    async def _next_batch(self) -> List[MailJob]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + MAIL_BATCH_WAIT_MS / 1000
+        while len(batch) < MAIL_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self, connection: SmtpConnection):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                batch = await self._next_batch()
+                try:
+                    results = await loop.run_in_executor(self._executor, connection.send_batch, batch)
+                except Exception as e:
+                    results = [e] * len(batch)
+                self.stats["batches"] += 1
+
+                now = time.monotonic()
+                for job, error in zip(batch, results):
+                    if error is None:
+                        self.stats["sent"] += 1
+                        self._latencies.append(now - job.enqueued_at)
+                    else:
+                        self._failed(job, error)
+                    self._queue.task_done()
+        finally:
+            await loop.run_in_executor(self._executor, connection.close)
+
+    def _failed(self, job: MailJob, error: Exception):
+        job.attempts += 1
+        job.last_error = f"{type(error).__name__}: {error}"
+        self.stats["failed_attempts"] += 1
+        if _is_permanent(error) or job.attempts >= MAIL_MAX_ATTEMPTS:
+            self._dead_letter(job)
+            return
+
+        delay = min(MAIL_RETRY_BASE * 2 ** (job.attempts - 1), MAIL_RETRY_MAX) * random.uniform(0.8, 1.2)
+        print(f"[MAIL] Retry {job.attempts}/{MAIL_MAX_ATTEMPTS} to {job.message['To']} in {delay:.1f}s: {job.last_error}")
+        self.stats["retried"] += 1
+        self._spawn(self._requeue(job, delay))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _requeue(self, job: MailJob, delay: float):
+        self._retry_pending += 1
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._retry_pending -= 1
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._dead_letter(job)
+
+    def _dead_letter(self, job: MailJob):
+        entry = {
+            "to": job.message["To"],
+            "subject": job.message["Subject"],
+            "attempts": job.attempts,
+            "error": job.last_error,
+            "at": time.time(),
+        }
+        self.dead_letters.append(entry)
+        self.stats["dead_lettered"] += 1
+        print(f"[MAIL] Dead letter to {entry['to']} after {job.attempts} attempts: {job.last_error}")
+        self._spawn(self._persist_dead_letter(entry))
+
+    @staticmethod
+    async def _persist_dead_letter(entry: dict):
+        try:
+            from redis_utils import async_r
+            pipe = async_r.pipeline()
+            pipe.lpush(MAIL_DEAD_LETTER_KEY, json.dumps(entry))
+            pipe.ltrim(MAIL_DEAD_LETTER_KEY, 0, MAIL_DEAD_LETTER_MAX - 1)
+            await pipe.execute()
+        except Exception as e:
+            print(f"[MAIL] Failed to persist dead letter: {e}")
+
+    def metrics(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def pct(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 1)
+
+        return {
+            **self.stats,
+            "queue_depth": self._queue.qsize(),
+            "retry_pending": self._retry_pending,
+            "latency_ms": {"p50": pct(0.5), "p99": pct(0.99)},
+        }
+
+
+mail_queue = MailQueue()
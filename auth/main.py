@@ -1,19 +1,27 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List
 import json
-import uuid
-import asyncio
+import os
   # Твої таблиці і клас моделі
 
 
 # Імпорти бази даних
-# from database import engine, Base
+from database import engine
+from redis_utils import close_async_redis
+from mail_queue import mail_queue
+from board_counts import board_count_reconciler
+from pro_status import pro_expiry_sweeper
+from stripe_client import stripe_gateway
+from stripe_events import stripe_event_worker
+from user_cache import user_invalidations
 import models 
 
 # Імпорти роутів
 from routes import auth_routes, boardroutes, user_routes
 from routes import payment_routes
+from room_backends import create_room_backend
+from relay import ConnectionManager
+import ws_codec
 
 app = FastAPI()
 
@@ -24,6 +32,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Інакше веб-клієнт не бачить ці заголовки (пагінація /boards/, ETag, 429/503)
+    expose_headers=["ETag", "X-Next-Cursor", "Retry-After"],
 )
 
 
@@ -42,105 +52,122 @@ app.include_router(boardroutes.router)
 # 3. WebSocket (WebRTC / Board Logic)
 # ==========================================
 
-class ConnectionManager:
-    def __init__(self):
-        # Структура: {board_id: {peer_id: WebSocket}}
-        self.rooms: Dict[str, Dict[str, WebSocket]] = {}
-        self.lock = asyncio.Lock()
-
-    async def connect(self, board_id: str, websocket: WebSocket) -> str | None:
-        await websocket.accept()
-        peer_id = str(uuid.uuid4())
-        
-        async with self.lock:
-            if board_id not in self.rooms:
-                self.rooms[board_id] = {}
-            
-            existing_peers_sockets = list(self.rooms[board_id].values())
-            existing_peer_ids = list(self.rooms[board_id].keys())
-
-            self.rooms[board_id][peer_id] = websocket
-            print(f"[CONNECT] Peer {peer_id} joined room {board_id}")
-
-        # Повідомляємо існуючих пірів про нового ("new-peer")
-        message_new_peer = {"type": "new-peer", "from": peer_id}
-        for ws in existing_peers_sockets:
-            try:
-                await ws.send_json(message_new_peer)
-            except Exception as e:
-                print(f"[ERROR] Failed to notify existing peer: {e}")
-
-        # Надсилаємо новому піру його ID та список існуючих ("connected")
-        try:
-            await websocket.send_json({
-                "type": "connected",
-                "peer_id": peer_id,
-                "existing_peers": existing_peer_ids
-            })
-        except Exception as e:
-            print(f"[ERROR] Failed to send init message: {e}")
-            await self.disconnect(board_id, peer_id)
-            return None
-
-        return peer_id
-
-    async def disconnect(self, board_id: str, peer_id: str):
-        peers_to_notify = []
-        async with self.lock:
-            if board_id in self.rooms and peer_id in self.rooms[board_id]:
-                del self.rooms[board_id][peer_id]
-                print(f"[DISCONNECT] Peer {peer_id} left room {board_id}")
-                
-                peers_to_notify = list(self.rooms[board_id].values())
-                
-                if not self.rooms[board_id]:
-                    del self.rooms[board_id]
-
-        # Повідомляємо інших, що пір вийшов ("peer-left")
-        message = {"type": "peer-left", "from": peer_id}
-        for ws in peers_to_notify:
-            try:
-                await ws.send_json(message)
-            except:
-                pass
-
-    async def send_to_peer(self, board_id: str, to_peer_id: str, message: dict):
-        ws = None
-        async with self.lock:
-            ws = self.rooms.get(board_id, {}).get(to_peer_id)
-        
-        if ws:
-            try:
-                await ws.send_json(message)
-            except Exception as e:
-                print(f"[ERROR] Send direct failed: {e}")
-
-    async def broadcast(self, board_id: str, message: dict, exclude_peer: str = None):
-        peers = []
-        async with self.lock:
-            if board_id in self.rooms:
-                peers = list(self.rooms[board_id].items()) 
-
-        for pid, ws in peers:
-            if pid == exclude_peer:
-                continue
-            try:
-                await ws.send_json(message)
-            except:
-                pass
+manager = ConnectionManager(create_room_backend())
+
+@app.on_event("startup")
+async def start_signaling():
+    await manager.start()
+
+@app.on_event("shutdown")
+async def stop_signaling():
+    await manager.stop()
+
+
+@app.get("/ws/metrics")
+async def websocket_metrics():
+    return manager.metrics()
+
+
+@app.on_event("startup")
+async def start_mail():
+    await mail_queue.start()
+
+@app.on_event("shutdown")
+async def stop_mail():
+    await mail_queue.stop()
+
+
+@app.get("/mail/metrics")
+async def mail_metrics():
+    return mail_queue.metrics()
+
+
+@app.on_event("startup")
+async def start_board_count_reconciler():
+    await board_count_reconciler.start()
+
+@app.on_event("shutdown")
+async def stop_board_count_reconciler():
+    await board_count_reconciler.stop()
+
+
+# Інвалідації user_cache з інших воркерів (оплата, вимкнення PRO за терміном)
+@app.on_event("startup")
+async def start_user_invalidations():
+    await user_invalidations.start()
+
+@app.on_event("shutdown")
+async def stop_user_invalidations():
+    await user_invalidations.stop()
+
+
+@app.on_event("startup")
+async def start_pro_expiry_sweeper():
+    await pro_expiry_sweeper.start()
+
+@app.on_event("shutdown")
+async def stop_pro_expiry_sweeper():
+    await pro_expiry_sweeper.stop()
+
+
+@app.on_event("startup")
+async def start_stripe_events():
+    await stripe_event_worker.start()
+
+@app.on_event("shutdown")
+async def stop_stripe_events():
+    await stripe_event_worker.stop()
+
+
+@app.get("/payments/metrics")
+async def payment_event_metrics():
+    return {**await stripe_event_worker.metrics(), "stripe_api": stripe_gateway.metrics()}
+
+
+# Пули з'єднань закриваємо останніми — після зупинки тих, хто ними користується
+@app.on_event("shutdown")
+async def close_pools():
+    await stripe_gateway.close()
+    await engine.dispose()
+    await close_async_redis()
 
-manager = ConnectionManager()
 
 @app.websocket("/ws/{board_id}")
-async def websocket_endpoint(websocket: WebSocket, board_id: str):
-    peer_id = await manager.connect(board_id, websocket)
+async def websocket_endpoint(websocket: WebSocket, board_id: str, coalesce_ms: int | None = None,
+                             compress: str | None = None):
+    peer_id = await manager.connect(board_id, websocket, coalesce_ms=coalesce_ms,
+                                    compress=(compress == "deflate"))
     
     if not peer_id:
         return 
     
     try:
         while True:
-            data = await websocket.receive_json()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            manager.touch(board_id, peer_id)
+            payload = message.get("bytes")
+            if payload is None:
+                payload = message.get("text") or ""
+            if len(payload) > ws_codec.WS_MAX_FRAME_BYTES:
+                print(f"[ERROR] Frame too big from {peer_id}: {len(payload)} bytes")
+                manager.stats["oversized_frames"] += 1
+                await manager.disconnect(board_id, peer_id)
+                await websocket.close(code=1009, reason="Frame too big")
+                return
+
+            if message.get("bytes") is not None:
+                # Бінарні кадри (напр. file-chunk) — пересилаємо як є, без JSON/base64
+                await manager.relay_binary(board_id, peer_id, message["bytes"])
+                continue
+
+            # Керуючі повідомлення — як і раніше, JSON
+            data = ws_codec.loads(message["text"])
+            if data.get("type") == "pong":
+                manager.touch(board_id, peer_id, pong=True)
+                continue
             
             data["from"] = peer_id 
             to_peer_id = data.get("to")
@@ -156,4 +183,22 @@ async def websocket_endpoint(websocket: WebSocket, board_id: str):
         await manager.disconnect(board_id, peer_id)
     except Exception as e:
         print(f"[ERROR] Unhandled: {e}")
-        await manager.disconnect(board_id, peer_id)
\ No newline at end of file
+        await manager.disconnect(board_id, peer_id)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    from peer_queue import WS_PING_INTERVAL
+
+    # permessage-deflate на рівні протоколу вимкнено за замовчуванням: великі кадри
+    # стискаються вибірково (ws_codec.WS_COMPRESS_MIN_BYTES), а дрібні не варто.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", 8000)),
+        ws_per_message_deflate=ws_codec.WS_PER_MESSAGE_DEFLATE,
+        ws_max_size=ws_codec.WS_MAX_FRAME_BYTES,
+        # Протокольний ping ловить напіввідкриті з'єднання й тих клієнтів, що не знають "pong"
+        ws_ping_interval=WS_PING_INTERVAL or None,
+        ws_ping_timeout=WS_PING_INTERVAL or None,
+    )
@@ -0,0 +1,44 @@
+"""Схема users/boards, як її створювали до міграцій (з pro_expires_at)
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("internal_id", sa.String(), primary_key=True),
+        sa.Column("public_id", sa.String(), nullable=False, unique=True),
+        sa.Column("email", sa.String(), nullable=False, unique=True),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("is_confirmed", sa.Boolean(), nullable=True),
+        sa.Column("is_pro", sa.Boolean(), nullable=True),
+        sa.Column("pro_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("stripe_customer_id", sa.String(), nullable=True),
+        sa.Column("stripe_subscription_id", sa.String(), nullable=True),
+        sa.Column("lemon_customer_id", sa.String(), nullable=True),
+        sa.Column("lemon_subscription_id", sa.String(), nullable=True),
+    )
+    op.create_table(
+        "boards",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("owner_id", sa.String(), sa.ForeignKey("users.internal_id"), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table("boards")
+    op.drop_table("users")
@@ -0,0 +1,32 @@
+"""users.board_count — лічильник дошок для ліміту free tier
+
+Revision ID: 0002_board_count
+Revises: 0001_baseline
+Create Date: 2026-10-18
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+revision = "0002_board_count"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Колонку могли вже додати вручну (колишній update_db.py); у режиму --sql перевірити нема як
+    if context.is_offline_mode() or "board_count" not in {
+        c["name"] for c in sa.inspect(op.get_bind()).get_columns("users")
+    }:
+        with op.batch_alter_table("users") as batch:
+            batch.add_column(sa.Column("board_count", sa.Integer(), nullable=False, server_default="0"))
+    op.execute(
+        "UPDATE users SET board_count = "
+        "(SELECT COUNT(*) FROM boards WHERE boards.owner_id = users.internal_id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("board_count")
@@ -0,0 +1,25 @@
+"""Індекси для дошок власника і пошуку користувача за Stripe customer
+
+Revision ID: 0003_lookup_indexes
+Revises: 0002_board_count
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0003_lookup_indexes"
+down_revision = "0002_board_count"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Складений індекс покриває і пошук лише за owner_id (лівий префікс),
+    # тож окремий індекс на owner_id не потрібен
+    op.create_index("ix_boards_owner_id_created_at", "boards", ["owner_id", "created_at"])
+    op.create_index("ix_users_stripe_customer_id", "users", ["stripe_customer_id"])
+
+
+def downgrade():
+    op.drop_index("ix_users_stripe_customer_id", table_name="users")
+    op.drop_index("ix_boards_owner_id_created_at", table_name="boards")
@@ -0,0 +1,40 @@
+"""Ключ пагінації дошок (created_at, id): created_at NOT NULL, id в індексі
+
+Revision ID: 0004_boards_keyset
+Revises: 0003_lookup_indexes
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_boards_keyset"
+down_revision = "0003_lookup_indexes"
+branch_labels = None
+depends_on = None
+
+
+def _now_sql() -> str:
+    # SQLite зберігає DateTime рядком, а курсор порівнюється з ним як рядок:
+    # формат має збігатися з SQLAlchemy ("YYYY-MM-DD HH:MM:SS.ffffff"),
+    # інакше рядок без дробової частини завжди "менший" за курсор
+    if op.get_bind().dialect.name == "sqlite":
+        return "strftime('%Y-%m-%d %H:%M:%f', 'now') || '000'"
+    return "CURRENT_TIMESTAMP"
+
+
+def upgrade():
+    # Рядки без created_at випали б із keyset-пагінації (NULL не порівнюється)
+    op.execute(f"UPDATE boards SET created_at = {_now_sql()} WHERE created_at IS NULL")
+    op.drop_index("ix_boards_owner_id_created_at", table_name="boards")
+    with op.batch_alter_table("boards") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+    # id в кінці індексу — сторінка (owner_id, created_at, id) читається без сортування
+    op.create_index("ix_boards_owner_id_created_at_id", "boards", ["owner_id", "created_at", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_boards_owner_id_created_at_id", table_name="boards")
+    with op.batch_alter_table("boards") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=True)
+    op.create_index("ix_boards_owner_id_created_at", "boards", ["owner_id", "created_at"])
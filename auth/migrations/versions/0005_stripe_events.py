@@ -0,0 +1,37 @@
+"""Таблиця stripe_events — черга вебхуків Stripe з дедуплікацією
+
+Revision ID: 0005_stripe_events
+Revises: 0004_boards_keyset
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005_stripe_events"
+down_revision = "0004_boards_keyset"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "stripe_events",
+        sa.Column("event_id", sa.String(), primary_key=True),
+        sa.Column("dedup_key", sa.String(), nullable=False, unique=True),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("available_at", sa.DateTime(), nullable=False),
+        sa.Column("claim", sa.String(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("received_at", sa.DateTime(), nullable=False),
+        sa.Column("processed_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_stripe_events_status_available_at", "stripe_events", ["status", "available_at"])
+
+
+def downgrade():
+    op.drop_index("ix_stripe_events_status_available_at", table_name="stripe_events")
+    op.drop_table("stripe_events")
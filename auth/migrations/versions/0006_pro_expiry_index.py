@@ -0,0 +1,23 @@
+"""Індекс users.pro_expires_at для фонового вимкнення PRO
+
+Revision ID: 0006_pro_expiry_index
+Revises: 0005_stripe_events
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0006_pro_expiry_index"
+down_revision = "0005_stripe_events"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # pro_status.expire_pro: UPDATE ... WHERE pro_expires_at < now — діапазон по індексу,
+    # у більшості користувачів NULL, тож зачіпаються лише ті, в кого термін минув
+    op.create_index("ix_users_pro_expires_at", "users", ["pro_expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_users_pro_expires_at", table_name="users")
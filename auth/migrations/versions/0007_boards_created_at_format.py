@@ -0,0 +1,27 @@
+"""boards.created_at у форматі SQLAlchemy для рядків, заповнених 0004
+
+Revision ID: 0007_boards_created_at_format
+Revises: 0006_pro_expiry_index
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0007_boards_created_at_format"
+down_revision = "0006_pro_expiry_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Бази, що вже пройшли 0004 з CURRENT_TIMESTAMP: "YYYY-MM-DD HH:MM:SS" без
+    # мікросекунд порівнюється з курсором як рядок і повертається на кожній
+    # сторінці. Postgres зберігає timestamp нативно — там нічого виправляти.
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute("UPDATE boards SET created_at = created_at || '.000000' WHERE length(created_at) = 19")
+
+
+def downgrade():
+    # Дописані нулі не змінюють момент часу — повертати нічого
+    pass
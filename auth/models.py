@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Index, Integer, Text
 from sqlalchemy.orm import relationship
 from database import Base
 import uuid
@@ -13,11 +13,14 @@ class UserInfo(Base):
     hashed_password = Column(String, nullable=False)
     is_confirmed = Column(Boolean, default=False)
     is_pro = Column(Boolean, default=False) 
-    pro_expires_at = Column(DateTime, nullable=True)
-    stripe_customer_id = Column(String, nullable=True)
+    # Індекс — для фонового вимкнення PRO з минулим терміном (pro_status.expire_pro)
+    pro_expires_at = Column(DateTime, nullable=True, index=True)
+    stripe_customer_id = Column(String, nullable=True, index=True)
     stripe_subscription_id = Column(String, nullable=True)
     lemon_customer_id = Column(String, nullable=True)
     lemon_subscription_id = Column(String, nullable=True)
+    # Кількість дошок — змінюється разом із boards у тій самій транзакції (див. boardroutes)
+    board_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     boards = relationship("Board", back_populates="owner")
 
@@ -26,6 +29,34 @@ class Board(Base):
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     owner_id = Column(String, ForeignKey("users.internal_id"), nullable=False)
     name = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
     owner = relationship("UserInfo", back_populates="boards")
+
+    # Схема змінюється лише міграціями (migrations/versions) — індекси тут мають їм відповідати
+    __table_args__ = (
+        Index("ix_boards_owner_id_created_at_id", "owner_id", "created_at", "id"),
+    )
+
+
+class StripeEvent(Base):
+    """Черга подій Stripe (див. stripe_events.py): вебхук лише зберігає подію, обробляє воркер."""
+    __tablename__ = "stripe_events"
+    event_id = Column(String, primary_key=True)
+    # Ідемпотентність ефекту: для checkout.session.completed — id сесії,
+    # щоб вебхук і /success зарахували оплату один раз; інакше — event_id
+    dedup_key = Column(String, nullable=False, unique=True)
+    type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending / processing / done / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    # Коли подію можна (пере)взяти: після затримки повтору або закінчення оренди воркера
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claim = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    received_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_stripe_events_status_available_at", "status", "available_at"),
+    )
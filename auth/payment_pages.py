@@ -0,0 +1,210 @@
+import gzip
+import hashlib
+import html
+import os
+from string import Formatter
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+# brotli — необов'язковий: без нього віддаємо gzip або нестиснуту сторінку
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# ===== Сторінки результату оплати =====
+# Результати рендеру кешуються: набір заголовків і повідомлень у роутів фіксований
+PAYMENT_PAGE_CACHE_SIZE = int(os.getenv("PAYMENT_PAGE_CACHE_SIZE", 64))
+# /cancel однаковий для всіх; /success залежить від сесії, тож лише ревалідація за ETag
+PAYMENT_PAGE_STATIC_MAX_AGE = int(os.getenv("PAYMENT_PAGE_STATIC_MAX_AGE", 86400))
+
+COLOR_PRIMARY = "#14b8a6"
+COLOR_BG = "#f0fdfa"
+
+ICON_SUCCESS = (
+    '<svg xmlns="http://www.w3.org/2000/svg" class="icon" viewBox="0 0 20 20" fill="currentColor">'
+    '<path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zm3.707-9.293a1 1 0 00-1.414-1.414L9 10.586 '
+    '7.707 9.293a1 1 0 00-1.414 1.414l2 2a1 1 0 001.414 0l4-4z" clip-rule="evenodd" /></svg>'
+)
+ICON_ERROR = (
+    '<svg xmlns="http://www.w3.org/2000/svg" class="icon icon-error" viewBox="0 0 20 20" fill="currentColor">'
+    '<path fill-rule="evenodd" d="M10 18a8 8 0 100-16 8 8 0 000 16zM8.707 7.293a1 1 0 00-1.414 1.414L8.586 10l-1.293 '
+    '1.293a1 1 0 101.414 1.414L10 11.414l1.293 1.293a1 1 0 001.414-1.414L11.414 10l1.293-1.293a1 1 0 00-1.414-1.414L10 '
+    '8.586 8.707 7.293z" clip-rule="evenodd" /></svg>'
+)
+
+# Шрифт Inter — лише якщо встановлений у системі: без запиту до Google Fonts
+PAGE_TEMPLATE = """
+    <!DOCTYPE html>
+    <html lang="uk">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>{title}</title>
+        <style>
+            body {{
+                margin: 0;
+                padding: 0;
+                font-family: 'Inter', system-ui, -apple-system, 'Segoe UI', Roboto, sans-serif;
+                background-color: {color_bg};
+                display: flex;
+                align-items: center;
+                justify-content: center;
+                height: 100vh;
+                color: #334155;
+            }}
+            .card {{
+                background: white;
+                padding: 3rem 2rem;
+                border-radius: 16px;
+                box-shadow: 0 10px 25px -5px rgba(0, 0, 0, 0.05), 0 8px 10px -6px rgba(0, 0, 0, 0.01);
+                text-align: center;
+                max-width: 400px;
+                width: 90%;
+                border-top: 6px solid {color_primary};
+            }}
+            .icon {{
+                width: 64px;
+                height: 64px;
+                color: {color_primary};
+                margin-bottom: 1rem;
+            }}
+            .icon-error {{
+                color: #ef4444;
+            }}
+            h1 {{
+                font-size: 1.5rem;
+                font-weight: 600;
+                margin-bottom: 0.5rem;
+                color: #0f172a;
+            }}
+            p {{
+                font-size: 1rem;
+                line-height: 1.5;
+                color: #64748b;
+                margin-bottom: 2rem;
+            }}
+            .btn {{
+                display: inline-block;
+                background-color: {color_primary};
+                color: white;
+                padding: 0.75rem 1.5rem;
+                border-radius: 8px;
+                text-decoration: none;
+                font-weight: 500;
+                transition: background-color 0.2s ease, transform 0.1s ease;
+            }}
+            .btn:hover {{
+                background-color: #0d9488;
+                transform: translateY(-1px);
+            }}
+            .footer {{
+                margin-top: 2rem;
+                font-size: 0.8rem;
+                color: #94a3b8;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="card">
+            {icon}
+            <h1>{title}</h1>
+            <p>{message}</p>
+            <a href="https://boardly.studio" class="btn">Go to our website</a>
+            <div class="footer">You can close this page</div>
+        </div>
+    </body>
+    </html>
+"""
+
+
+def compile_template(template: str, **static: str) -> Tuple[Tuple[str, Optional[str]], ...]:
+    """
+    Розбирає шаблон один раз: відступи рядків прибираються, поля з static
+    підставляються одразу (вони довірені й не екрануються). Лишається
+    послідовність (текст, поле) — рендер лише склеює шматки.
+    """
+    compact = "\n".join(line.strip() for line in template.strip().splitlines())
+    parts, literal = [], ""
+    for text, field, _, _ in Formatter().parse(compact):
+        literal += text
+        if field is None:
+            continue
+        if field in static:
+            literal += static[field]
+        else:
+            parts.append((literal, field))
+            literal = ""
+    parts.append((literal, None))
+    return tuple(parts)
+
+
+def render(compiled: Tuple[Tuple[str, Optional[str]], ...], **values: str) -> str:
+    # Значення з роутів екрануються завжди — в них може потрапити рядок від Stripe чи користувача
+    return "".join(text + (html.escape(values[field]) if field else "") for text, field in compiled)
+
+
+_static = {"color_primary": COLOR_PRIMARY, "color_bg": COLOR_BG}
+_SUCCESS_SHELL = compile_template(PAGE_TEMPLATE, icon=ICON_SUCCESS, **_static)
+_ERROR_SHELL = compile_template(PAGE_TEMPLATE, icon=ICON_ERROR, **_static)
+
+
+class RenderedPage:
+    """Готова сторінка: тіло, стиснуті варіанти і ETag кожного з них."""
+    __slots__ = ("body", "variants")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        digest = hashlib.sha1(body).hexdigest()
+        # {content-encoding: (тіло, ETag)}; у кожного представлення свій ETag
+        self.variants: Dict[str, Tuple[bytes, str]] = {"identity": (body, f'"{digest}"')}
+        self.variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gz"')
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(body, mode=brotli.MODE_TEXT), f'"{digest}-br"')
+
+    def etags(self) -> set[str]:
+        return {etag for _, etag in self.variants.values()}
+
+
+_pages: Dict[Tuple[str, str, bool], RenderedPage] = {}
+
+
+def payment_page(title: str, message: str, is_success: bool = True) -> RenderedPage:
+    key = (title, message, is_success)
+    page = _pages.get(key)
+    if page is None:
+        shell = _SUCCESS_SHELL if is_success else _ERROR_SHELL
+        page = RenderedPage(render(shell, title=title, message=message).encode("utf-8"))
+        if len(_pages) >= PAYMENT_PAGE_CACHE_SIZE:
+            _pages.pop(next(iter(_pages)))
+        _pages[key] = page
+    return page
+
+
+def _accepted_encodings(request: Request) -> set[str]:
+    # q-значення не розбираємо: "br;q=0" на практиці ніхто не надсилає
+    header = request.headers.get("accept-encoding", "")
+    return {part.split(";")[0].strip().lower() for part in header.split(",")}
+
+
+def page_response(request: Request, page: RenderedPage, cacheable: bool = False) -> Response:
+    """
+    Вибирає br, gzip або нестиснуте тіло за Accept-Encoding. Для If-None-Match
+    з будь-яким ETag цієї сторінки — 304 без тіла.
+    """
+    accepted = _accepted_encodings(request)
+    encoding = next((e for e in ("br", "gzip") if e in accepted and e in page.variants), "identity")
+    body, etag = page.variants[encoding]
+
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": f"public, max-age={PAYMENT_PAGE_STATIC_MAX_AGE}" if cacheable else "private, no-cache",
+    }
+    if_none_match = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    if page.etags() & if_none_match or "*" in if_none_match:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="text/html; charset=utf-8", headers=headers)
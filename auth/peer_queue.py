@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import WebSocket
+
+# ===== Налаштування черг =====
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 256))
+# drop_oldest | coalesce | disconnect
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest").lower()
+
+# ===== Heartbeat =====
+# Сервер шле {"type": "ping"} кожні WS_PING_INTERVAL сек; будь-який вхідний кадр
+# (зокрема "pong") оновлює last_seen. Пір, що вже відповідав на ping і мовчить
+# довше за WS_IDLE_TIMEOUT, вважається мертвим. 0 — не виганяти за бездіяльність.
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", 25))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", 75))
+# Піри, що жодного разу не відповіли "pong" (старі клієнти, coll_server без ping),
+# за тишею не виганяються: мовчазний глядач — не мертвий. Напіввідкриті
+# з'єднання таких пірів закриває протокольний ping uvicorn (ws_ping_interval,
+# увімкнений за замовчуванням — і для coll_server).
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_COALESCE = "coalesce"
+OVERFLOW_DISCONNECT = "disconnect"
+
+# Повідомлення, які можна замінити новішою версією від того ж відправника
+COALESCIBLE_TYPES = {"item-update", "connection-update", "cursor", "cursor-move"}
+
+
+def coalesce_key(message: dict) -> Optional[tuple]:
+    """
+    Ключ, за яким новіше повідомлення витісняє старіше.
+    None — повідомлення дискретне і не може бути злите.
+    """
+    msg_type = message.get("type")
+    if msg_type not in COALESCIBLE_TYPES:
+        return None
+
+    item = message.get("item")
+    item_id = item.get("id") if isinstance(item, dict) else None
+    return (message.get("from"), msg_type, item_id)
+
+
+class PeerSender:
+    """
+    Обмежена черга вихідних повідомлень для одного піра.
+    Бродкаст лише кладе повідомлення в чергу, а окрема задача-писач
+    відправляє їх у сокет, тож повільний клієнт не гальмує кімнату.
+
+    У черзі лежать вже закодовані кадри (str — текстові JSON, bytes — бінарні)
+    разом з ключем злиття, тож один і той самий кадр ділиться між усіма отримувачами.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        on_close: Callable[[], Awaitable[None]],
+        stats: Dict[str, int],
+        max_queue: int = WS_SEND_QUEUE_SIZE,
+        overflow_policy: str = WS_OVERFLOW_POLICY,
+        compress: bool = False,
+    ):
+        self.websocket = websocket
+        # Пір погодився отримувати великі кадри стиснутими (?compress=deflate)
+        self.compress = compress
+        self.queue: Deque[Tuple[str | bytes, Optional[tuple]]] = deque()
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.dropped = 0
+        self.closed = False
+        self.last_seen = time.monotonic()
+        # Старі клієнти не знають про pong — для них таймаут бездіяльності не діє
+        self.answers_ping = False
+        self._on_close = on_close
+        self._stats = stats
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._writer())
+
+    def touch(self, pong: bool = False):
+        self.last_seen = time.monotonic()
+        if pong:
+            self.answers_ping = True
+
+    def is_dead(self, now: float) -> bool:
+        if self.closed:
+            return True
+        return bool(WS_IDLE_TIMEOUT) and self.answers_ping and now - self.last_seen > WS_IDLE_TIMEOUT
+
+    def enqueue(self, frame: str | bytes, key: Optional[tuple] = None) -> bool:
+        """
+        Не блокує. Повертає False, якщо кадр не потрапив у чергу.
+        key — результат coalesce_key() для вихідного повідомлення.
+        """
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.max_queue:
+            return self._overflow(frame, key)
+
+        self._push(frame, key)
+        return True
+
+    def _push(self, frame: str | bytes, key: Optional[tuple]):
+        self.queue.append((frame, key))
+        if len(self.queue) > self._stats["max_queue_depth"]:
+            self._stats["max_queue_depth"] = len(self.queue)
+        self._wakeup.set()
+
+    def _overflow(self, frame: str | bytes, key: Optional[tuple]) -> bool:
+        self.dropped += 1
+        self._stats["dropped"] += 1
+
+        if self.overflow_policy == OVERFLOW_DISCONNECT:
+            self._stats["overflow_disconnects"] += 1
+            self._fail("send queue overflow")
+            return False
+
+        if self.overflow_policy == OVERFLOW_COALESCE:
+            if key is not None:
+                for i, (_, queued_key) in enumerate(self.queue):
+                    if queued_key == key:
+                        # Викидаємо застаріле оновлення того ж елемента, нове йде в кінець
+                        del self.queue[i]
+                        self._stats["coalesced"] += 1
+                        self._push(frame, key)
+                        return True
+
+        self.queue.popleft()
+        self._push(frame, key)
+        return True
+
+    async def _writer(self):
+        try:
+            while True:
+                if not self.queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                frame, _ = self.queue.popleft()
+                if isinstance(frame, bytes):
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail(f"send failed: {e}")
+
+    def _fail(self, reason: str):
+        if self.closed:
+            return
+        print(f"[ERROR] Dropping slow/dead peer: {reason}")
+        self.closed = True
+        self.queue.clear()
+        # Від'єднання робимо окремою задачею, бо нас могли викликати з broadcast
+        asyncio.create_task(self._on_close())
+
+    async def close(self):
+        self.closed = True
+        self.queue.clear()
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
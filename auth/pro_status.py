@@ -0,0 +1,178 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import DateTime, case, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from database import AsyncSessionLocal
+from models import UserInfo
+from user_cache import publish_invalidation
+
+# ===== PRO статус: масові зміни одним UPDATE =====
+PRO_GIFT_DAYS = int(os.getenv("PRO_GIFT_DAYS", 30))  # скільки днів додає разовий платіж
+# Як часто вимикати PRO з минулим терміном (сек, 0 — не вимикати)
+PRO_EXPIRY_SWEEP_INTERVAL = float(os.getenv("PRO_EXPIRY_SWEEP_INTERVAL", 60))
+
+
+class _plus_days(FunctionElement):
+    """Дата + N днів у SQL: на SQLite датами опікується strftime, у Postgres — interval."""
+    type = DateTime()
+    name = "plus_days"
+    inherit_cache = True
+
+
+@compiles(_plus_days)
+def _plus_days_default(element, compiler, **kw):
+    value, days = (compiler.process(arg, **kw) for arg in element.clauses)
+    return f"({value} + {days} * INTERVAL '1 day')"
+
+
+@compiles(_plus_days, "sqlite")
+def _plus_days_sqlite(element, compiler, **kw):
+    value, days = (compiler.process(arg, **kw) for arg in element.clauses)
+    # Формат, який читає DateTime SQLAlchemy; точність — мілісекунди
+    return f"strftime('%Y-%m-%d %H:%M:%f', {value}, '+' || {days} || ' days')"
+
+
+async def _lock_users(db: AsyncSession, user_ids: Iterable[str]) -> List[str]:
+    # Блокуємо в порядку internal_id: два групові подарунки зі спільними
+    # отримувачами чекають один на одного, а не ловлять deadlock.
+    # На SQLite FOR UPDATE не рендериться — там пише лише одна транзакція.
+    ids = sorted(set(filter(None, user_ids)))
+    if not ids:
+        return []
+    return list(await db.scalars(
+        select(UserInfo.internal_id).where(UserInfo.internal_id.in_(ids))
+        .order_by(UserInfo.internal_id).with_for_update()
+    ))
+
+
+async def extend_pro(db: AsyncSession, user_ids: Iterable[str], days: int = PRO_GIFT_DAYS,
+                     now: Optional[datetime] = None) -> List[str]:
+    """
+    Разовий платіж: +days до активного PRO або від "зараз", якщо його немає
+    чи він минув — MAX(pro_expires_at, now) + days одним UPDATE на всіх.
+    Commit — за викликачем. Повертає internal_id змінених користувачів.
+    """
+    ids = await _lock_users(db, user_ids)
+    if not ids:
+        return []
+    now = now or datetime.utcnow()
+    # NULL > now — не істина, тож користувач без терміну отримує now + days
+    expires_at = case(
+        (UserInfo.pro_expires_at > literal(now, DateTime), _plus_days(UserInfo.pro_expires_at, days)),
+        else_=literal(now + timedelta(days=days), DateTime),
+    )
+    result = await db.execute(
+        update(UserInfo)
+        .where(UserInfo.internal_id.in_(ids))
+        .values(is_pro=True, pro_expires_at=expires_at)
+        .returning(UserInfo.internal_id)
+        .execution_options(synchronize_session=False)
+    )
+    return list(result.scalars())
+
+
+async def activate_subscription(db: AsyncSession, user_ids: Iterable[str], customer_id: Optional[str],
+                                subscription_id: Optional[str]) -> List[str]:
+    """
+    Підписка: PRO без терміну для всіх; subscription_id записується лише
+    платнику (тому, чий stripe_customer_id збігається з customer_id).
+    """
+    ids = await _lock_users(db, user_ids)
+    if not ids:
+        return []
+    # Дата закінчення заважала б перевірці терміну вимкнути PRO
+    values = {"is_pro": True, "pro_expires_at": None}
+    if customer_id:
+        values["stripe_subscription_id"] = case(
+            (UserInfo.stripe_customer_id == customer_id, subscription_id),
+            else_=UserInfo.stripe_subscription_id,
+        )
+    result = await db.execute(
+        update(UserInfo)
+        .where(UserInfo.internal_id.in_(ids))
+        .values(**values)
+        .returning(UserInfo.internal_id)
+        .execution_options(synchronize_session=False)
+    )
+    return list(result.scalars())
+
+
+async def expire_pro(db: AsyncSession, now: Optional[datetime] = None) -> List[str]:
+    """
+    Вимикає PRO всім, у кого pro_expires_at минув, одним UPDATE по індексу
+    ix_users_pro_expires_at і комітить. Повертає internal_id вимкнених.
+
+    Паралельний extend_pro того ж користувача не загубиться: UPDATE чекає
+    на блокування рядка і перевіряє умову вже на новому терміні.
+    """
+    now = now or datetime.utcnow()
+    result = await db.execute(
+        update(UserInfo)
+        .where(UserInfo.pro_expires_at < now)
+        .values(is_pro=False, pro_expires_at=None)
+        .returning(UserInfo.internal_id)
+        .execution_options(synchronize_session=False)
+    )
+    expired = list(result.scalars())
+    await db.commit()
+    return expired
+
+
+class ProExpirySweeper:
+    """
+    Фонове вимкнення PRO за терміном кожні PRO_EXPIRY_SWEEP_INTERVAL секунд,
+    незалежно від того, чи заходить користувач. Вимкнені розсилаються через
+    publish_invalidation — і user_cache, і admission coll_server бачать
+    зміну одразу. У кожному воркері своя — UPDATE ідемпотентний.
+    """
+
+    def __init__(self, interval: float = PRO_EXPIRY_SWEEP_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"sweeps": 0, "expired": 0}
+
+    async def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def sweep(self) -> int:
+        async with AsyncSessionLocal() as db:
+            expired = await expire_pro(db)
+        self.stats["sweeps"] += 1
+        if expired:
+            self.stats["expired"] += len(expired)
+            await publish_invalidation(*expired)
+            print(f"[PRO] Expired PRO for {len(expired)} users")
+        return len(expired)
+
+    async def _run(self):
+        # Перший прохід одразу: за час простою терміни могли минути
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"[PRO] Expiry sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+pro_expiry_sweeper = ProExpirySweeper()
+
+
+if __name__ == "__main__":
+    # Разовий запуск (напр. з cron, якщо фоновий прохід вимкнено): python pro_status.py
+    async def _main():
+        print(f"Expired PRO for {await ProExpirySweeper(interval=0).sweep()} users")
+
+    asyncio.run(_main())
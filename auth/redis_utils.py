@@ -1,63 +1,275 @@
 import redis
+import redis.asyncio
+import math
 import os
+import time
+import uuid
 from datetime import timedelta
 
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+# Верхня межа з'єднань спільного пулу на процес
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+
+# Синхронний клієнт — для потоків і скриптів (room_backends)
 r = redis.Redis(
-    host=os.getenv("REDIS_HOST", "localhost"),
-    port=int(os.getenv("REDIS_PORT", 6379)),
+    host=REDIS_HOST,
+    port=REDIS_PORT,
     db=0,
     decode_responses=True
 )
 
-# ===== Login attempts =====
-MAX_LOGIN_ATTEMPTS = 5
-ATTEMPT_RESET = 300  # сек
+# Асинхронний клієнт для обробників FastAPI на спільному пулі з'єднань
+pool = redis.asyncio.ConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=0,
+    decode_responses=True,
+    max_connections=REDIS_MAX_CONNECTIONS,
+)
+async_r = redis.asyncio.Redis(connection_pool=pool)
+
+
+async def close_async_redis():
+    await async_r.aclose()
+    await pool.disconnect()
+
+
+# ===== Ключі Redis Cluster =====
+# Скрипт або MULTI працює в кластері, лише якщо всі його ключі в одному слоті.
+# Слот рахується з частини в {фігурних дужках} (хеш-тег), тож ключі, які
+# змінюються разом, мають спільний тег: ліміт — {scope}, вхід — {email},
+# refresh-токени — {user_id}.
+
+# ===== Rate limiting (ковзне вікно) =====
+# Кожен ключ — sorted set міток часу запитів (мс) за останнє вікно.
+# KEYS = ratelimit:{scope}:{ip|id}:..., ARGV = now_ms, window_ms, member,
+# далі ліміт для кожного ключа. Запит зараховується в усі ключі лише тоді,
+# коли жоден ліміт не вичерпано. Повертає {1, 0} або {0, retry_after_ms}.
+_sliding_window = async_r.register_script("""
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= tonumber(ARGV[3 + i]) then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        retry_after = math.max(retry_after, tonumber(oldest[2]) + window - now)
+    end
+end
+if retry_after > 0 then
+    return {0, retry_after}
+end
+for _, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[3])
+    redis.call('PEXPIRE', key, window)
+end
+return {1, 0}
+""")
+
+def rate_limit_key(scope: str, kind: str, value: str) -> str:
+    return f"ratelimit:{{{scope}}}:{kind}:{value}"
+
+async def hit_rate_limit(limits: dict[str, int], window: int) -> int:
+    """
+    Зараховує запит у ковзні вікна {ключ: ліміт} тривалістю window секунд —
+    один EVALSHA на всі ключі (з rate_limit_key одного scope). Повертає 0
+    або через скільки секунд повторити.
+    """
+    keys = list(limits)
+    now_ms = int(time.time() * 1000)
+    allowed, retry_after_ms = await _sliding_window(
+        keys=keys,
+        args=[now_ms, window * 1000, f"{now_ms}:{uuid.uuid4().hex[:8]}", *limits.values()],
+    )
+    return 0 if allowed else max(1, math.ceil(retry_after_ms / 1000))
+
+
+# ===== Невдалі спроби входу =====
+# login:{email} — лічильник невдалих спроб; скидається успішним входом.
+# confirm:{email} — код підтвердження; обидва з хеш-тегом email.
+# Ковзне вікно login_limit (за IP) — лише грубий ліміт зверху.
+MAX_LOGIN_ATTEMPTS = int(os.getenv("MAX_LOGIN_ATTEMPTS", 5))
+ATTEMPT_RESET = int(os.getenv("LOGIN_ATTEMPT_RESET", 300))  # сек
+
+# Лічильник спроб, його TTL і код підтвердження за один прохід:
+# KEYS = _attempts_key(email), _code_key(email) -> {спроби, ttl, код або false}
+_login_precheck = async_r.register_script("""
+local attempts = tonumber(redis.call('GET', KEYS[1]) or '0')
+return {attempts, redis.call('TTL', KEYS[1]), redis.call('GET', KEYS[2])}
+""")
+
+def _attempts_key(email: str) -> str:
+    return f"login:{{{email}}}"
+
+def _code_key(email: str) -> str:
+    return f"confirm:{{{email}}}"
 
-def record_login_attempt(username: str):
-    key = f"login:{username}"
-    pipe = r.pipeline()
+def _too_many_attempts(retry_after: int):
+    from fastapi import HTTPException
+    return HTTPException(status_code=429, detail="Too many login attempts",
+                         headers={"Retry-After": str(max(1, retry_after))})
+
+async def record_login_attempt(username: str):
+    key = _attempts_key(username)
+    pipe = async_r.pipeline()
     pipe.incr(key)
     pipe.expire(key, ATTEMPT_RESET)
-    pipe.execute()
+    await pipe.execute()
 
-def check_login_attempts(username: str):
-    key = f"login:{username}"
-    count = r.get(key)
-    if count and int(count) >= MAX_LOGIN_ATTEMPTS:
-        from fastapi import HTTPException
-        raise HTTPException(status_code=429, detail="Too many login attempts")
+async def check_attempts_and_get_code(username: str) -> str | None:
+    """
+    Перевірка лічильника невдалих спроб + get_code одним запитом (Lua).
+    Кидає 429, якщо спроб забагато; інакше повертає код або None.
+    """
+    attempts, ttl, code = await _login_precheck(keys=[_attempts_key(username), _code_key(username)])
+    if attempts >= MAX_LOGIN_ATTEMPTS:
+        raise _too_many_attempts(ttl if ttl > 0 else ATTEMPT_RESET)
+    return code or None
 
-def reset_login_attempt(username: str):
-    r.delete(f"login:{username}")
+async def reset_login_attempt(username: str):
+    await async_r.delete(_attempts_key(username))
 
 
 # ===== Refresh tokens на пристроях =====
-def store_refresh_token(user_id: str, device_id: str, jti: str, expires_in: int):
-    key = f"refresh:{user_id}:{device_id}"
-    r.setex(key, timedelta(seconds=expires_in), jti)
+# refresh:{user}:{device} -> jti; refresh_devices:{user} — set пристроїв користувача,
+# щоб відкликати всі токени без сканування KEYS. TTL індексу завжди не менший
+# за TTL будь-якого з його токенів (оновлюється при кожному записі).
+# {user} — хеш-тег: ротація і відкликання всіх пристроїв зачіпають один слот.
+def _refresh_key(user_id: str, device_id: str) -> str:
+    return f"refresh:{{{user_id}}}:{device_id}"
+
+def _devices_key(user_id: str) -> str:
+    return f"refresh_devices:{{{user_id}}}"
+
+# Ключі без хеш-тегу, видані до його появи. Читаються лише як запасний
+# варіант і зникнуть самі за REFRESH_EXPIRE_DAYS — без примусового виходу всіх.
+def _legacy_refresh_key(user_id: str, device_id: str) -> str:
+    return f"refresh:{user_id}:{device_id}"
+
+def _legacy_devices_key(user_id: str) -> str:
+    return f"refresh_devices:{user_id}"
+
+def _queue_refresh_token(pipe, user_id: str, device_id: str, jti: str, expires_in: int):
+    pipe.setex(_refresh_key(user_id, device_id), timedelta(seconds=expires_in), jti)
+    pipe.sadd(_devices_key(user_id), device_id)
+    pipe.expire(_devices_key(user_id), expires_in)
+
+async def store_refresh_token(user_id: str, device_id: str, jti: str, expires_in: int):
+    pipe = async_r.pipeline()
+    _queue_refresh_token(pipe, user_id, device_id, jti, expires_in)
+    await pipe.execute()
+
+async def complete_login(username: str, user_id: str, device_id: str, jti: str, expires_in: int):
+    """Успішний вхід: скидання лічильника спроб і новий refresh-токен — один пайплайн."""
+    # Без MULTI: ключі входу й токена в різних слотах, атомарність тут не потрібна
+    pipe = async_r.pipeline(transaction=False)
+    pipe.delete(_attempts_key(username))
+    _queue_refresh_token(pipe, user_id, device_id, jti, expires_in)
+    await pipe.execute()
 
-def is_refresh_token_valid(user_id: str, device_id: str, jti: str) -> bool:
-    key = f"refresh:{user_id}:{device_id}"
-    stored_jti = r.get(key)
+async def is_refresh_token_valid(user_id: str, device_id: str, jti: str) -> bool:
+    stored_jti = await async_r.get(_refresh_key(user_id, device_id))
+    if stored_jti is None:
+        stored_jti = await async_r.get(_legacy_refresh_key(user_id, device_id))
     return stored_jti == jti
 
-def revoke_refresh_token(user_id: str, device_id: str):
-    key = f"refresh:{user_id}:{device_id}"
-    r.delete(key)
+# Ротація refresh-токена як compare-and-swap:
+# KEYS = _refresh_key(user, device), _devices_key(user) — спільний слот {user},
+# ARGV = старий jti, новий jti, TTL (сек), device_id.
+# Новий jti записується, лише якщо збережений дорівнює старому — два
+# одночасні /refresh з тим самим токеном не пройдуть обидва.
+# SADD підхоплює в індекс токени, записані ще до його появи.
+_rotate_refresh = async_r.register_script("""
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+redis.call('SADD', KEYS[2], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+""")
+
+# Забирає старий jti з ключа без хеш-тегу: KEYS[1] — legacy ключ, ARGV[1] — jti.
+# Один ключ — один слот; з двох одночасних запитів DEL виконає лише один.
+_take_legacy_refresh = async_r.register_script("""
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+return 1
+""")
+
+async def rotate_refresh_token(user_id: str, device_id: str, old_jti: str, new_jti: str, expires_in: int) -> bool:
+    """False — токен уже відкликано, прострочено або ротовано іншим запитом."""
+    rotated = await _rotate_refresh(
+        keys=[_refresh_key(user_id, device_id), _devices_key(user_id)],
+        args=[old_jti, new_jti, expires_in, device_id],
+    )
+    if rotated == 1:
+        return True
+    # Токен, виданий до хеш-тегів: переносимо на нові ключі першою ж ротацією
+    if await _take_legacy_refresh(keys=[_legacy_refresh_key(user_id, device_id)], args=[old_jti]) != 1:
+        return False
+    await store_refresh_token(user_id, device_id, new_jti, expires_in)
+    return True
+
+async def revoke_refresh_token(user_id: str, device_id: str):
+    pipe = async_r.pipeline(transaction=False)
+    pipe.delete(_refresh_key(user_id, device_id))
+    pipe.srem(_devices_key(user_id), device_id)
+    pipe.delete(_legacy_refresh_key(user_id, device_id))
+    await pipe.execute()
+
+async def revoke_all_refresh_tokens(user_id: str) -> int:
+    """
+    Вихід з усіх пристроїв (напр. після зміни пароля). Повертає кількість пристроїв.
+
+    Ключі токенів читаються з індексу і видаляються в MULTI, а не будуються
+    в Lua: кожен ключ команди оголошений явно, і всі в слоті {user_id}.
+    WATCH на індексі: пристрій, доданий між SMEMBERS і EXEC, не лишиться живим.
+    """
+    await _revoke_legacy_refresh(user_id)
+    devices_key = _devices_key(user_id)
+    async with async_r.pipeline() as pipe:
+        while True:
+            try:
+                await pipe.watch(devices_key)
+                devices = await pipe.smembers(devices_key)
+                pipe.multi()
+                for device_id in devices:
+                    pipe.delete(_refresh_key(user_id, device_id))
+                pipe.delete(devices_key)
+                await pipe.execute()
+                return len(devices)
+            except redis.WatchError:
+                continue
+
+async def _revoke_legacy_refresh(user_id: str):
+    # Старі ключі в різних слотах — окремими командами; нових туди вже не пишуть
+    legacy_index = _legacy_devices_key(user_id)
+    devices = await async_r.smembers(legacy_index)
+    if not devices:
+        return
+    pipe = async_r.pipeline(transaction=False)
+    for device_id in devices:
+        pipe.delete(_legacy_refresh_key(user_id, device_id))
+    pipe.delete(legacy_index)
+    await pipe.execute()
 
 # ===== Confirmation codes =====
-def store_code(email: str, code: int, expires_in: int = 300):
+async def store_code(email: str, code: int, expires_in: int = 300):
     """
     Зберігає код підтвердження в Redis з TTL
     """
-    key = f"confirm:{email}"
-    r.setex(key, timedelta(seconds=expires_in), code)
+    key = _code_key(email)
+    await async_r.setex(key, timedelta(seconds=expires_in), code)
 
-def get_code(email: str) -> str | None:
+async def get_code(email: str) -> str | None:
     """
     Отримує код підтвердження для email.
     Повертає None, якщо коду немає або він протух.
     """
-    key = f"confirm:{email}"
-    code = r.get(key)
+    key = _code_key(email)
+    code = await async_r.get(key)
     return code
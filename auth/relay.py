@@ -0,0 +1,408 @@
+import asyncio
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import WebSocket
+
+import ws_codec
+from coalescing import BroadcastCoalescer, clamp_window
+from peer_queue import PeerSender, coalesce_key, WS_PING_INTERVAL
+from room_backends import InProcessRoomBackend
+
+
+# ==========================================
+# Спільний рушій ретрансляції для /ws/{board_id} (main.py)
+# та /ws/{room_id} (routes/coll_server/main.py)
+# ==========================================
+
+class AdmissionRejected(Exception):
+    """
+    Відмова в підключенні від admission-перевірки.
+    notice — текст, який встигаємо надіслати клієнту перед закриттям.
+    """
+
+    def __init__(self, code: int, reason: str, notice: str | None = None):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+        self.notice = notice
+
+    async def reject(self, websocket: WebSocket):
+        if self.notice is not None:
+            # Треба прийняти, щоб відправити повідомлення або закрити коректно
+            await websocket.accept()
+            await websocket.send_text(self.notice)
+        await websocket.close(code=self.code, reason=self.reason)
+
+
+# Admission повертає ліміт підключень для кімнати (None — без ліміту)
+# або кидає AdmissionRejected. Сам ліміт перевіряється атомарно під lock менеджера.
+Admission = Callable[[str], Awaitable[Optional[int]]]
+
+def limit_reached() -> AdmissionRejected:
+    # Новий екземпляр на кожну відмову: спільний накопичував би __traceback__
+    return AdmissionRejected(1008, "Connection limit reached", notice="LIMIT_REACHED")
+
+
+class Room:
+    """
+    Стан однієї кімнати. peers змінюється лише під lock менеджера,
+    а snapshot — незмінний кортеж, який підміняється цілком при кожній зміні складу.
+    Гарячий шлях (broadcast/send_to_peer) читає snapshot без жодних блокувань.
+    """
+    __slots__ = ("peers", "snapshot", "coalescer")
+
+    def __init__(self):
+        self.peers: Dict[str, PeerSender] = {}
+        self.snapshot: tuple = ()
+        # Вмикається для кімнати першим піром через ?coalesce_ms=
+        self.coalescer: BroadcastCoalescer | None = None
+
+    def add(self, peer_id: str, sender: PeerSender):
+        self.peers[peer_id] = sender
+        self.snapshot = tuple(self.peers.items())
+
+    def remove_many(self, peer_ids) -> Dict[str, PeerSender]:
+        removed = {pid: self.peers.pop(pid) for pid in peer_ids if pid in self.peers}
+        if removed:
+            # Один новий знімок на всю пачку
+            self.snapshot = tuple(self.peers.items())
+        return removed
+
+
+class ConnectionManager:
+    """
+    Рушій ретрансляції: кімнати, черги пірів, heartbeat, бекенд між воркерами.
+
+    announce=False — "сирий" режим без службових повідомлень (connected,
+    new-peer, peer-left, ping): клієнт бачить лише кадри інших учасників.
+    admission — необов'язкова перевірка перед підключенням (див. Admission).
+    """
+
+    def __init__(self, backend=None, admission: Admission | None = None, announce: bool = True):
+        # Структура: {board_id: Room} — лише локальні сокети цього воркера
+        self.rooms: Dict[str, Room] = {}
+        # Синхронізує лише зміни складу кімнат (connect/disconnect)
+        self.lock = asyncio.Lock()
+        # Бекенд кімнат: пам'ять процесу або Redis pub/sub між воркерами
+        self.backend = backend or InProcessRoomBackend()
+        self.admission = admission
+        self.announce = announce
+        # Лічильники черг відправки (для /ws/metrics)
+        self.stats = {"dropped": 0, "coalesced": 0, "overflow_disconnects": 0, "max_queue_depth": 0,
+                      "window_coalesced": 0, "compressed_frames": 0, "oversized_frames": 0,
+                      "reaped": 0, "rejected": 0}
+        self._heartbeat: asyncio.Task | None = None
+
+    async def start(self):
+        await self.backend.start(self._deliver_local)
+        if WS_PING_INTERVAL:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat:
+            self._heartbeat.cancel()
+        await self.backend.stop()
+
+    async def connect(self, board_id: str, websocket: WebSocket, coalesce_ms: int | None = None,
+                      compress: bool = False) -> str | None:
+        limit = None
+        if self.admission is not None:
+            try:
+                limit = await self.admission(board_id)
+            except AdmissionRejected as rejected:
+                self.stats["rejected"] += 1
+                await rejected.reject(websocket)
+                return None
+
+        peer_id = str(uuid.uuid4())
+
+        async def on_close():
+            # Писач помер або черга переповнилась — закриваємо сокет і прибираємо піра
+            await self.disconnect(board_id, peer_id)
+            try:
+                await websocket.close(code=1013)
+            except Exception:
+                pass
+
+        sender = PeerSender(websocket, on_close, self.stats, compress=compress)
+        
+        async with self.lock:
+            room = self.rooms.get(board_id)
+            # Перевірка ліміту і додавання — атомарно, без await між ними
+            full = limit is not None and room is not None and len(room.peers) >= limit
+            if full:
+                pass
+            elif room is None:
+                room = self.rooms[board_id] = Room()
+                window_ms = clamp_window(coalesce_ms)
+                if window_ms:
+                    async def emit(message, exclude_peer, board_id=board_id):
+                        await self._fanout(board_id, message, exclude_peer)
+                    room.coalescer = BroadcastCoalescer(window_ms, emit, self.stats)
+            
+            if not full:
+                existing_peers = room.snapshot
+                existing_peer_ids = list(room.peers.keys())
+
+                room.add(peer_id, sender)
+                print(f"[CONNECT] Peer {peer_id} joined room {board_id}")
+
+        if not full:
+            # Ліміт рахується по всіх воркерах разом — за спільним складом кімнати в бекенді
+            try:
+                remote_peer_ids = await self.backend.join(board_id, peer_id, limit)
+            except Exception:
+                await self._drop_unannounced(board_id, peer_id)
+                raise
+            if remote_peer_ids is None:
+                full = True
+                await self._drop_unannounced(board_id, peer_id)
+
+        if full:
+            print(f"[LIMIT] Room {board_id} is full ({limit} connections)")
+            self.stats["rejected"] += 1
+            await limit_reached().reject(websocket)
+            return None
+
+        # Поки сокет не прийнято, повідомлення для піра лише накопичуються в його черзі
+        try:
+            await websocket.accept()
+        except Exception as e:
+            print(f"[ERROR] Failed to accept {peer_id}: {e}")
+            await self.disconnect(board_id, peer_id)
+            return None
+
+        # Піри цієї ж кімнати на інших воркерах
+        existing_peer_ids += [pid for pid in remote_peer_ids if pid not in existing_peer_ids]
+
+        if not self.announce:
+            sender.start()
+            return peer_id
+
+        # Надсилаємо новому піру його ID та список існуючих ("connected") — першим у черзі
+        sender.enqueue(ws_codec.dumps({
+            "type": "connected",
+            "peer_id": peer_id,
+            "existing_peers": existing_peer_ids
+        }))
+        sender.start()
+
+        # Повідомляємо існуючих пірів про нового ("new-peer")
+        frame = ws_codec.dumps({"type": "new-peer", "from": peer_id})
+        for _, peer in existing_peers:
+            peer.enqueue(frame)
+        await self.backend.publish(board_id, frame, exclude_peer=peer_id)
+
+        return peer_id
+
+    async def _drop_unannounced(self, board_id: str, peer_id: str):
+        # Пір, про якого ще ніхто не знає: без "peer-left" і без backend.leave
+        async with self.lock:
+            room = self.rooms.get(board_id)
+            if room is None or not room.remove_many([peer_id]):
+                return
+            if not room.peers:
+                del self.rooms[board_id]
+                if room.coalescer:
+                    room.coalescer.close()
+
+    async def disconnect(self, board_id: str, peer_id: str):
+        await self._remove_peers({board_id: [peer_id]})
+
+    async def _remove_peers(self, by_room: Dict[str, List[str]]) -> List[PeerSender]:
+        """
+        Прибирає пірів з кімнат пачкою (один lock, один знімок на кімнату)
+        і розсилає "peer-left" тим, хто лишився.
+        """
+        removed_by_room = []
+        async with self.lock:
+            for board_id, peer_ids in by_room.items():
+                room = self.rooms.get(board_id)
+                if room is None:
+                    continue
+                removed = room.remove_many(peer_ids)
+                if not removed:
+                    continue
+                for peer_id in removed:
+                    print(f"[DISCONNECT] Peer {peer_id} left room {board_id}")
+
+                if not room.peers:
+                    del self.rooms[board_id]
+                    if room.coalescer:
+                        room.coalescer.close()
+                removed_by_room.append((board_id, room.snapshot, removed))
+
+        senders = []
+        for board_id, peers_to_notify, removed in removed_by_room:
+            for peer_id, sender in removed.items():
+                await sender.close()
+                senders.append(sender)
+
+                await self.backend.leave(board_id, peer_id)
+                if not self.announce:
+                    continue
+
+                # Повідомляємо інших, що пір вийшов ("peer-left")
+                frame = ws_codec.dumps({"type": "peer-left", "from": peer_id})
+                for _, peer in peers_to_notify:
+                    peer.enqueue(frame)
+                await self.backend.publish(board_id, frame, exclude_peer=peer_id)
+        return senders
+
+    def touch(self, board_id: str, peer_id: str, pong: bool = False):
+        peer = self._find_peer(board_id, peer_id)
+        if peer is not None:
+            peer.touch(pong)
+
+    async def _heartbeat_loop(self):
+        # У "сирому" режимі клієнт ping не зрозуміє — лише прибираємо мертвих
+        ping = ws_codec.dumps({"type": "ping"}) if self.announce else None
+        while True:
+            await asyncio.sleep(WS_PING_INTERVAL)
+            try:
+                await self.reap(ping)
+            except Exception as e:
+                print(f"[ERROR] Heartbeat failed: {e}")
+
+    async def reap(self, ping: str | None = None):
+        """
+        Один прохід heartbeat: живим пірам — ping, мертвих (напіввідкриті
+        з'єднання, зламаний писач, мовчання довше WS_IDLE_TIMEOUT) — виганяємо разом.
+        """
+        now = time.monotonic()
+        dead: Dict[str, List[str]] = {}
+        for board_id, room in list(self.rooms.items()):
+            for peer_id, peer in room.snapshot:
+                if peer.is_dead(now):
+                    dead.setdefault(board_id, []).append(peer_id)
+                elif ping is not None:
+                    peer.enqueue(ping)
+
+        if not dead:
+            return
+        senders = await self._remove_peers(dead)
+        self.stats["reaped"] += len(senders)
+        for sender in senders:
+            asyncio.create_task(self._close_quietly(sender.websocket, 1001))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), timeout=5)
+        except Exception:
+            pass
+
+    def _find_peer(self, board_id: str, peer_id: str) -> PeerSender | None:
+        room = self.rooms.get(board_id)
+        return room.peers.get(peer_id) if room is not None else None
+
+    async def send_to_peer(self, board_id: str, to_peer_id: str, message: dict):
+        await self._send_frame_to_peer(board_id, to_peer_id, ws_codec.dumps(message))
+
+    def _enqueue_direct(self, peer: PeerSender, frame: str | bytes, key: tuple | None = None):
+        # Особисті кадри (напр. full-board новому піру) — найбільші, стискаємо як і бродкаст
+        if peer.compress and ws_codec.should_compress(frame):
+            frame = self._deflate(frame)
+        peer.enqueue(frame, key)
+
+    async def _send_frame_to_peer(self, board_id: str, to_peer_id: str, frame: str | bytes):
+        peer = self._find_peer(board_id, to_peer_id)
+        if peer:
+            self._enqueue_direct(peer, frame)
+        else:
+            # Адресат може бути підключений до іншого воркера
+            await self.backend.publish(board_id, frame, to_peer=to_peer_id)
+
+    async def broadcast(self, board_id: str, message: dict, exclude_peer: str = None):
+        room = self.rooms.get(board_id)
+        if room is not None and room.coalescer is not None:
+            await room.coalescer.submit(message, exclude_peer)
+            return
+        await self._fanout(board_id, message, exclude_peer)
+
+    async def _fanout(self, board_id: str, message: dict, exclude_peer: str = None):
+        # Кодуємо один раз — той самий кадр отримують усі піри, локальні й віддалені
+        frame = ws_codec.dumps(message)
+        key = coalesce_key(message)
+        await self._fanout_frame(board_id, frame, key, exclude_peer)
+
+    async def _fanout_frame(self, board_id: str, frame: str | bytes, key: tuple | None = None,
+                            exclude_peer: str = None):
+        await self._send_local(board_id, frame, key, exclude_peer=exclude_peer)
+        await self.backend.publish(board_id, frame, key, exclude_peer=exclude_peer)
+
+    async def broadcast_frame(self, board_id: str, frame: str | bytes, exclude_peer: str = None):
+        """Розсилка вже готового кадру як є (напр. текст у coll_server)."""
+        await self._fanout_frame(board_id, frame, exclude_peer=exclude_peer)
+
+    async def relay_binary(self, board_id: str, from_peer: str, data: bytes):
+        """
+        Пересилає бінарний кадр без розбору тіла — лише заголовок маршрутизації
+        (формат див. у ws_codec). Тіло не кодується в base64 і не парситься.
+        """
+        try:
+            kind, to_peer, body = ws_codec.unpack_binary(data)
+        except ValueError as e:
+            print(f"[ERROR] Bad binary frame from {from_peer}: {e}")
+            return
+
+        frame = ws_codec.pack_binary(kind, from_peer, body)
+        if to_peer:
+            await self._send_frame_to_peer(board_id, to_peer, frame)
+            return
+
+        room = self.rooms.get(board_id)
+        if room is not None and room.coalescer is not None:
+            # Не обганяємо накопичені у вікні оновлення
+            await room.coalescer.submit_now(lambda: self._fanout_frame(board_id, frame, exclude_peer=from_peer))
+            return
+        await self._fanout_frame(board_id, frame, exclude_peer=from_peer)
+
+    async def _send_local(self, board_id: str, frame: str | bytes, key: tuple | None = None, exclude_peer: str = None):
+        room = self.rooms.get(board_id)
+        if room is None:
+            return
+
+        # Стискаємо щонайбільше один раз на кадр і лише якщо комусь це потрібно
+        compressible = ws_codec.should_compress(frame)
+        deflated = None
+
+        # Лише кладемо в черги — відправкою займаються писачі кожного піра
+        for pid, peer in room.snapshot:
+            if pid == exclude_peer:
+                continue
+            if compressible and peer.compress:
+                if deflated is None:
+                    deflated = self._deflate(frame)
+                peer.enqueue(deflated, key)
+            else:
+                peer.enqueue(frame, key)
+
+    def _deflate(self, frame: str) -> bytes:
+        self.stats["compressed_frames"] += 1
+        return ws_codec.deflate_frame(frame)
+
+    async def _deliver_local(self, board_id: str, frame: str | bytes, key: tuple | None = None,
+                             to_peer: str | None = None, exclude_peer: str | None = None):
+        """
+        Доставка кадру, що прийшов з іншого воркера, лише локальним пірам.
+        """
+        if to_peer:
+            peer = self._find_peer(board_id, to_peer)
+            if peer:
+                self._enqueue_direct(peer, frame, key)
+            return
+
+        await self._send_local(board_id, frame, key, exclude_peer=exclude_peer)
+
+    def metrics(self) -> dict:
+        depths = [len(peer.queue) for room in list(self.rooms.values()) for _, peer in room.snapshot]
+        return {
+            "rooms": len(self.rooms),
+            "peers": len(depths),
+            "queued_messages": sum(depths),
+            "current_max_queue_depth": max(depths, default=0),
+            **self.stats,
+        }
@@ -0,0 +1,267 @@
+import asyncio
+import base64
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import ws_codec
+
+# Колбек, який менеджер кімнат передає бекенду:
+# (board_id, frame, key, to_peer, exclude_peer) -> доставка локальним сокетам.
+# frame — вже закодований JSON (str) або бінарний кадр (bytes),
+# key — ключ злиття (див. peer_queue.coalesce_key)
+DeliverCallback = Callable[[str, str | bytes, Optional[tuple], Optional[str], Optional[str]], Awaitable[None]]
+
+
+class InProcessRoomBackend:
+    """
+    Кімнати живуть лише в пам'яті поточного процесу.
+    Поведінка за замовчуванням: один воркер, жодного зовнішнього сервісу.
+    """
+
+    async def start(self, deliver: DeliverCallback):
+        self._deliver = deliver
+
+    async def stop(self):
+        pass
+
+    async def join(self, board_id: str, peer_id: str, limit: int | None = None) -> Optional[List[str]]:
+        # Пірів на інших воркерах не існує; ліміт локальної кімнати перевіряє менеджер
+        return []
+
+    async def leave(self, board_id: str, peer_id: str):
+        pass
+
+    async def publish(self, board_id: str, frame: str | bytes, key: tuple | None = None,
+                      to_peer: str | None = None, exclude_peer: str | None = None):
+        pass
+
+
+class RedisRoomBackend:
+    """
+    Розсилка між воркерами/хостами через Redis pub/sub.
+
+    Кожен процес тримає свої локальні сокети, а склад кімнати (peer_id)
+    зберігається в Redis sorted set зі строком життя кожного піра: воркер
+    продовжує його своїм пірам кожні MEMBER_REFRESH секунд, тож піри впалого
+    воркера зникають за MEMBER_TTL і не займають місць у ліміті кімнати.
+    Повідомлення публікуються в канал кімнати, і кожен воркер доставляє
+    їх лише своїм локальним пірам.
+
+    Воркер підписаний лише на канали кімнат, де є його локальні піри:
+    SUBSCRIBE з першим піром кімнати, UNSUBSCRIBE з останнім — трафік
+    чужих кімнат до нього не доходить.
+    """
+
+    MEMBER_TTL = 90  # сек без продовження — пір вважається зниклим (впав воркер)
+    MEMBER_REFRESH = 30  # сек між продовженнями строку локальних пірів
+
+    # Склад кімнати і ліміт одним кроком, атомарно для всіх воркерів:
+    # KEYS[1] — sorted set {peer_id: строк, мс}; ARGV: peer_id, now_ms, ttl_ms, ліміт (0 — без ліміту).
+    # Повертає пірів, що вже в кімнаті, або false, якщо кімната заповнена.
+    _JOIN_SCRIPT = """
+    local now = tonumber(ARGV[2])
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+    local members = redis.call('ZRANGE', KEYS[1], 0, -1)
+    local limit = tonumber(ARGV[4])
+    if limit > 0 and #members >= limit then
+        return false
+    end
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+    redis.call('PEXPIRE', KEYS[1], ARGV[3])
+    return members
+    """
+
+    def __init__(self, client=None, namespace: str = "ws"):
+        if client is None:
+            from redis_utils import r as client
+        self.r = client
+        # Окремий простір імен для кожного сервера, щоб кімнати не перетиналися
+        self.CHANNEL_PREFIX = f"{namespace}:room:"
+        # Новий префікс: колишні ws:members:* були set-ами без строків пірів
+        self.MEMBERS_PREFIX = f"{namespace}:peers:"
+        self.node_id = uuid.uuid4().hex
+        # Один потік на всі команди Redis — зберігає порядок повідомлень
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ws-redis")
+        self._stopped = threading.Event()
+        self._pubsub = None
+        self._listener = None
+        self._consumer = None
+        self._refresher = None
+        self._join_script = self.r.register_script(self._JOIN_SCRIPT)
+        # {board_id: локальні peer_id}; змінюється лише в циклі подій
+        self._local_peers: Dict[str, set] = {}
+
+    def _channel(self, board_id: str) -> str:
+        return f"{self.CHANNEL_PREFIX}{board_id}"
+
+    def _members_key(self, board_id: str) -> str:
+        return f"{self.MEMBERS_PREFIX}{board_id}"
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def start(self, deliver: DeliverCallback):
+        self._deliver = deliver
+        self._loop = asyncio.get_running_loop()
+        self._inbox: asyncio.Queue = asyncio.Queue()
+
+        # Підписки з'являються в join(); до першої get_message лише чекає
+        self._pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+
+        self._listener = threading.Thread(target=self._listen, name="ws-redis-listener", daemon=True)
+        self._listener.start()
+        self._consumer = asyncio.create_task(self._consume())
+        self._refresher = asyncio.create_task(self._refresh_loop())
+        print(f"[REDIS] Room backend started, node {self.node_id}")
+
+    async def stop(self):
+        self._stopped.set()
+        if self._consumer:
+            self._consumer.cancel()
+        if self._refresher:
+            self._refresher.cancel()
+        if self._listener:
+            await asyncio.to_thread(self._listener.join, 2)
+        if self._pubsub:
+            self._pubsub.close()
+        self._executor.shutdown(wait=False)
+
+    def _listen(self):
+        # Працює в окремому потоці: синхронний клієнт блокує на get_message
+        while not self._stopped.is_set():
+            try:
+                msg = self._pubsub.get_message(timeout=1.0)
+            except Exception as e:
+                print(f"[ERROR] Redis pub/sub listener: {e}")
+                self._stopped.wait(1.0)
+                continue
+
+            if not msg or msg.get("type") != "message":
+                continue
+
+            self._loop.call_soon_threadsafe(self._inbox.put_nowait, msg)
+
+    async def _consume(self):
+        # Доставляємо по одному, щоб зберегти порядок з каналу
+        while True:
+            msg = await self._inbox.get()
+            try:
+                envelope = ws_codec.loads(msg["data"])
+                if envelope.get("node") == self.node_id:
+                    continue
+                board_id = msg["channel"][len(self.CHANNEL_PREFIX):]
+                key = tuple(envelope["key"]) if envelope.get("key") else None
+                if "bframe" in envelope:
+                    frame = base64.b64decode(envelope["bframe"])
+                else:
+                    frame = envelope["frame"]
+                await self._deliver(board_id, frame, key, envelope.get("to"), envelope.get("exclude"))
+            except Exception as e:
+                print(f"[ERROR] Failed to deliver remote message: {e}")
+
+    async def join(self, board_id: str, peer_id: str, limit: int | None = None) -> Optional[List[str]]:
+        """
+        Додає піра до спільного складу кімнати. None — у кімнаті (на всіх
+        воркерах разом) вже limit пірів, пір не доданий.
+        """
+        key = self._members_key(board_id)
+        # Рахуємо до першого await: join і leave тієї ж кімнати не розминуться,
+        # а єдиний потік executor-а виконає SUBSCRIBE/UNSUBSCRIBE в тому ж порядку
+        first = board_id not in self._local_peers
+        self._local_peers.setdefault(board_id, set()).add(peer_id)
+
+        def _join():
+            if first:
+                # Раніше за ZADD: відповіді інших воркерів новому піру не загубляться
+                self._pubsub.subscribe(self._channel(board_id))
+            return self._join_script(
+                keys=[key], args=[peer_id, int(time.time() * 1000), self.MEMBER_TTL * 1000, limit or 0]
+            )
+
+        members = await self._run(_join)
+        if members is None:
+            # Кімната заповнена — пір не з'явився, тож і підписку не тримаємо
+            await self._forget(board_id, peer_id)
+            return None
+        return list(members)
+
+    def _untrack(self, board_id: str, peer_id: str) -> bool:
+        """Прибирає піра з локальних; True — це був останній локальний пір кімнати."""
+        local = self._local_peers.get(board_id)
+        if local is None or peer_id not in local:
+            return False
+        local.discard(peer_id)
+        if local:
+            return False
+        del self._local_peers[board_id]
+        return True
+
+    async def _forget(self, board_id: str, peer_id: str):
+        if self._untrack(board_id, peer_id):
+            await self._run(self._pubsub.unsubscribe, self._channel(board_id))
+
+    async def leave(self, board_id: str, peer_id: str):
+        # Пір міг не дійти до join (напр. не вдався accept) — тоді підписку не чіпаємо
+        last = self._untrack(board_id, peer_id)
+
+        def _leave():
+            self.r.zrem(self._members_key(board_id), peer_id)
+            if last:
+                self._pubsub.unsubscribe(self._channel(board_id))
+
+        await self._run(_leave)
+
+    async def _refresh_loop(self):
+        # Продовжуємо строк лише своїм пірам; ZADD XX не воскресить того, хто вже вийшов
+        while True:
+            await asyncio.sleep(self.MEMBER_REFRESH)
+            rooms = {board_id: list(peers) for board_id, peers in self._local_peers.items()}
+            if not rooms:
+                continue
+
+            def _refresh():
+                expires_at = int(time.time() * 1000) + self.MEMBER_TTL * 1000
+                pipe = self.r.pipeline(transaction=False)
+                for board_id, peer_ids in rooms.items():
+                    key = self._members_key(board_id)
+                    pipe.zadd(key, dict.fromkeys(peer_ids, expires_at), xx=True)
+                    pipe.pexpire(key, self.MEMBER_TTL * 1000)
+                pipe.execute()
+
+            try:
+                await self._run(_refresh)
+            except Exception as e:
+                print(f"[ERROR] Failed to refresh room members: {e}")
+
+    async def publish(self, board_id: str, frame: str | bytes, key: tuple | None = None,
+                      to_peer: str | None = None, exclude_peer: str | None = None):
+        # Кадр вже закодований — передаємо його як рядок, без повторного розбору на іншому боці.
+        # Клієнт Redis працює з decode_responses=True, тож бінарні кадри йдуть у base64.
+        envelope = {
+            "node": self.node_id,
+            "to": to_peer,
+            "exclude": exclude_peer,
+            "key": key,
+        }
+        if isinstance(frame, bytes):
+            envelope["bframe"] = base64.b64encode(frame).decode("ascii")
+        else:
+            envelope["frame"] = frame
+        envelope = ws_codec.dumps(envelope)
+        await self._run(self.r.publish, self._channel(board_id), envelope)
+
+
+def create_room_backend(namespace: str = "ws"):
+    """
+    Вибір бекенду через SIGNALING_BACKEND: "memory" (за замовчуванням) або "redis".
+    namespace — префікс каналів і ключів Redis для конкретного сервера.
+    """
+    kind = os.getenv("SIGNALING_BACKEND", "memory").lower()
+    if kind == "redis":
+        return RedisRoomBackend(namespace=namespace)
+    return InProcessRoomBackend()
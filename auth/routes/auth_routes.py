@@ -1,93 +1,82 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Body, status
-from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Body
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import jwt
 import uuid
-from datetime import datetime # <--- ДОДАНО
+from redis.exceptions import RedisError
 
 from database import get_db
+from dependencies import RateLimit, load_cached_user
 from models import UserInfo
 from schemas import LoginRequest, RegisterRequest, EmailRequest, ResetPasswordRequest
-from auth import hash_password, verify_password, create_access_token
+from auth import hash_password_async, verify_and_update_async, create_access_token
 from email_utils import generate_code, send_confirmation_email
+from mail_queue import MailQueueFull
 from utils import (
-    record_login_attempt,
-    check_login_attempts,
-    reset_login_attempt,
     store_refresh_token,
-    is_refresh_token_valid,
-    revoke_refresh_token
+    rotate_refresh_token,
+    revoke_refresh_token,
+    revoke_all_refresh_tokens
 )
-from redis_utils import get_code, store_code
+from redis_utils import check_attempts_and_get_code, complete_login, get_code, record_login_attempt, store_code
+from user_cache import publish_invalidation
 from config import SECRET_KEY, ALGORITHM, REFRESH_EXPIRE_DAYS
 
 router = APIRouter()
 
-# --- Схема авторизації та функція get_current_user (захист) ---
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+# --- Ліміти запитів: ковзне вікно за IP і за email/пристроєм ---
+confirmation_limit = RateLimit("confirm", window=600, per_ip=20, per_identity=5,
+                               identity=lambda body: body.get("email"))
+register_limit = RateLimit("register", window=600, per_ip=20, per_identity=5,
+                           identity=lambda body: body.get("email"))
+# Для входу — лише грубий ліміт за IP; перебір пароля для email обмежує
+# лічильник невдалих спроб (redis_utils.MAX_LOGIN_ATTEMPTS), що скидається при успіху
+login_limit = RateLimit("login", window=300, per_ip=50)
+refresh_limit = RateLimit("refresh", window=60, per_ip=120, per_identity=20,
+                          identity=lambda body: body.get("device_id"))
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+
+def _login_unavailable() -> HTTPException:
+    return HTTPException(status_code=503, detail="Login is temporarily unavailable", headers={"Retry-After": "5"})
+
+
+async def _failed_login(email: str, detail: str):
+    """Зараховує невдалу спробу і відповідає 400."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token expired",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    except jwt.PyJWTError:
-        raise credentials_exception
-    
-    user = db.query(UserInfo).filter(UserInfo.internal_id == user_id).first()
-    if user is None:
-        raise credentials_exception
-        
-    # --- [НОВЕ] ПЕРЕВІРКА ЧАСУ ДІЇ ПІДПИСКИ ---
-    # Якщо у користувача є термін дії PRO і він минув — вимикаємо PRO
-    if user.is_pro and user.pro_expires_at:
-        if datetime.utcnow() > user.pro_expires_at:
-            user.is_pro = False
-            user.pro_expires_at = None
-            db.commit()
-            # Користувач продовжує роботу, але вже без PRO прав
-    # ------------------------------------------
-        
-    return user
+        await record_login_attempt(email)
+    except RedisError:
+        raise _login_unavailable()
+    raise HTTPException(status_code=400, detail=detail)
 
 # --- Основні роути ---
 
 # --- Роут, який викликав 504 помилку ---
 
-@router.post("/request-confirmation")
-async def request_confirmation(request: EmailRequest, background_tasks: BackgroundTasks):
+@router.post("/request-confirmation", dependencies=[Depends(confirmation_limit)])
+async def request_confirmation(request: EmailRequest):
     """
-    Генеруємо код, зберігаємо в Redis і відправляємо пошту у фоні,
+    Генеруємо код, зберігаємо в Redis і ставимо лист у чергу пошти,
     щоб уникнути таймауту (504 Gateway Time-out).
     """
     code = generate_code()
     
     # 1. Зберігаємо в Redis (працює миттєво)
-    store_code(request.email, code)
+    await store_code(request.email, code)
     
-    # 2. Додаємо відправку листа у фонову чергу FastAPI.
+    # 2. Лист відправить mail_queue через постійне SMTP-з'єднання.
     # Це дозволяє серверу віддати відповідь клієнту негайно.
-    background_tasks.add_task(send_confirmation_email, request.email, code)
+    try:
+        send_confirmation_email(request.email, code)
+    except MailQueueFull:
+        raise HTTPException(status_code=503, detail="Mail service is busy, try again later", headers={"Retry-After": "5"})
     
     # 3. Повертаємо відповідь клієнту, не чекаючи завершення SMTP сесії
     return {"message": "Confirmation code sent"}
 
-@router.post("/register")
-async def register(data: RegisterRequest, db: Session = Depends(get_db)):
+@router.post("/register", dependencies=[Depends(register_limit)])
+async def register(data: RegisterRequest, db: AsyncSession = Depends(get_db)):
     # 1. Перевірка коду
-    raw_code = get_code(data.email)
+    raw_code = await get_code(data.email)
     if raw_code is None:
         raise HTTPException(status_code=400, detail="Код підтвердження не знайдено або термін дії вичерпано")
     
@@ -97,7 +86,7 @@ async def register(data: RegisterRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Невірний код підтвердження")
 
     # 2. Email duplicate check
-    existing_user = db.query(UserInfo).filter(UserInfo.email == data.email).first()
+    existing_user = await db.scalar(select(UserInfo).where(UserInfo.email == data.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Користувач з таким email вже існує")
 
@@ -105,15 +94,15 @@ async def register(data: RegisterRequest, db: Session = Depends(get_db)):
     user = UserInfo(
         email=data.email,
         username=data.username,
-        hashed_password=hash_password(data.password),
+        hashed_password=await hash_password_async(data.password),
         is_confirmed=True
     )
     db.add(user)
     try:
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Помилка бази даних при реєстрації: {str(e)}")
 
     # 4. Generate tokens
@@ -122,89 +111,100 @@ async def register(data: RegisterRequest, db: Session = Depends(get_db)):
     jti = str(uuid.uuid4())
     
     refresh_token = jwt.encode({"sub": user_id_str, "jti": jti}, SECRET_KEY, algorithm=ALGORITHM)
-    store_refresh_token(user_id_str, "default_device", jti, REFRESH_EXPIRE_DAYS*24*3600)
+    await store_refresh_token(user_id_str, "default_device", jti, REFRESH_EXPIRE_DAYS*24*3600)
 
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
-@router.post("/login")
-async def login(data: LoginRequest, device_id: str = Body(...), db: Session = Depends(get_db)):
+@router.post("/login", dependencies=[Depends(login_limit)])
+async def login(data: LoginRequest, device_id: str = Body(...), db: AsyncSession = Depends(get_db)):
     
     # [TESTERS BACKDOOR]
     if data.email in ["ms_test_free@boardly.app", "ms_test_pro@boardly.app"] and data.password == "TestPassword123!":
-        user = db.query(UserInfo).filter(UserInfo.email == data.email).first()
+        user = await db.scalar(select(UserInfo).where(UserInfo.email == data.email))
         if not user:
             is_pro_account = (data.email == "ms_test_pro@boardly.app")
             user = UserInfo(
                 email=data.email,
                 username="Tester",
-                hashed_password=hash_password(data.password),
+                hashed_password=await hash_password_async(data.password),
                 is_confirmed=True,
                 is_pro=is_pro_account
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
         else:
             if data.email == "ms_test_pro@boardly.app" and not user.is_pro:
                 user.is_pro = True
-                db.commit()
+                await db.commit()
+                await publish_invalidation(user.internal_id)
 
         user_id_str = str(user.internal_id)
         access_token = create_access_token(user_id_str)
         jti = str(uuid.uuid4())
         refresh_token = jwt.encode({"sub": user_id_str, "jti": jti}, SECRET_KEY, algorithm=ALGORITHM)
-        store_refresh_token(user_id_str, device_id, jti, REFRESH_EXPIRE_DAYS*24*3600)
+        await store_refresh_token(user_id_str, device_id, jti, REFRESH_EXPIRE_DAYS*24*3600)
         return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
     
     # Normal Login
-    check_login_attempts(data.email)
-    
-    raw_code = get_code(data.email)
+    # Ліміт невдалих спроб і код підтвердження — один запит до Redis.
+    # Без Redis не пускаємо: інакше перебір пароля нічим не обмежений
+    try:
+        raw_code = await check_attempts_and_get_code(data.email)
+    except RedisError:
+        raise _login_unavailable()
     if raw_code is None:
-        record_login_attempt(data.email)
-        raise HTTPException(status_code=400, detail="Confirmation code not found")
+        await _failed_login(data.email, "Confirmation code not found")
         
     expected_code = raw_code.decode('utf-8') if isinstance(raw_code, bytes) else str(raw_code)
     
     if expected_code != data.email_code:
-        record_login_attempt(data.email)
-        raise HTTPException(status_code=400, detail="Incorrect verification code")
+        await _failed_login(data.email, "Incorrect verification code")
+
+    user = await db.scalar(select(UserInfo).where(UserInfo.email == data.email))
+    if not user:
+        await _failed_login(data.email, "Incorrect email or password")
 
-    user = db.query(UserInfo).filter(UserInfo.email == data.email).first()
-    if not user or not verify_password(data.password, user.hashed_password):
-        record_login_attempt(data.email)
-        raise HTTPException(status_code=400, detail="Incorrect email or password")
+    password_ok, new_hash = await verify_and_update_async(data.password, user.hashed_password)
+    if not password_ok:
+        await _failed_login(data.email, "Incorrect email or password")
+    if new_hash:
+        # Хеш зі старою вартістю bcrypt — тихо оновлюємо
+        user.hashed_password = new_hash
+        await db.commit()
 
-    reset_login_attempt(data.email)
     user_id_str = str(user.internal_id)
     access_token = create_access_token(user_id_str)
     jti = str(uuid.uuid4())
     
     refresh_token = jwt.encode({"sub": user_id_str, "jti": jti}, SECRET_KEY, algorithm=ALGORITHM)
-    store_refresh_token(user_id_str, device_id, jti, REFRESH_EXPIRE_DAYS*24*3600)
+    # Скидання лічильника спроб і запис refresh-токена — один пайплайн
+    await complete_login(data.email, user_id_str, device_id, jti, REFRESH_EXPIRE_DAYS*24*3600)
 
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 @router.post("/reset-password")
-async def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)):
-    raw_code = get_code(data.email)
+async def reset_password(data: ResetPasswordRequest, db: AsyncSession = Depends(get_db)):
+    raw_code = await get_code(data.email)
     if raw_code is None:
         raise HTTPException(status_code=400, detail="Confirmation code expired or not found")
         
     expected_code = raw_code.decode('utf-8') if isinstance(raw_code, bytes) else str(raw_code)
     if expected_code != data.code:
         raise HTTPException(status_code=400, detail="Incorrect code")
-    user = db.query(UserInfo).filter(UserInfo.email == data.email).first()
+    user = await db.scalar(select(UserInfo).where(UserInfo.email == data.email))
     if not user:
         raise HTTPException(status_code=404, detail="User with such email not found")
 
-    user.hashed_password = hash_password(data.new_password)
-    db.commit()
-    revoke_refresh_token(str(user.internal_id), "all") 
+    user.hashed_password = await hash_password_async(data.new_password)
+    await db.commit()
+    await publish_invalidation(user.internal_id)
+    # Вихід з усіх пристроїв — за індексом пристроїв користувача, без KEYS
+    await revoke_all_refresh_tokens(str(user.internal_id))
     return {"message": "Password successfully changed"}
 
-@router.post("/refresh")
-async def refresh_token(refresh_token: str = Body(...), device_id: str = Body(...)):
+@router.post("/refresh", dependencies=[Depends(refresh_limit)])
+async def refresh_token(refresh_token: str = Body(...), device_id: str = Body(...), db: AsyncSession = Depends(get_db)):
     try:
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
     except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
@@ -212,14 +212,19 @@ async def refresh_token(refresh_token: str = Body(...), device_id: str = Body(..
 
     user_id = payload.get("sub")
     jti = payload.get("jti")
+    # Access-токен чи старий refresh без jti — не refresh-токен цього сервера
+    if not user_id or not jti:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-    if not is_refresh_token_valid(user_id, device_id, jti):
-        raise HTTPException(status_code=401, detail="Token revoked or expired")
+    user = await load_cached_user(user_id, db)
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
 
-    revoke_refresh_token(user_id, device_id)
+    # Перевірка старого jti і запис нового — атомарно, один запит до Redis
     new_jti = str(uuid.uuid4())
+    if not await rotate_refresh_token(user_id, device_id, jti, new_jti, REFRESH_EXPIRE_DAYS*24*3600):
+        raise HTTPException(status_code=401, detail="Token revoked or expired")
     new_refresh_token = jwt.encode({"sub": user_id, "jti": new_jti}, SECRET_KEY, algorithm=ALGORITHM)
-    store_refresh_token(user_id, device_id, new_jti, REFRESH_EXPIRE_DAYS*24*3600)
 
     return {"access_token": create_access_token(user_id), "refresh_token": new_refresh_token, "token_type": "bearer"}
 
@@ -227,7 +232,7 @@ async def refresh_token(refresh_token: str = Body(...), device_id: str = Body(..
 async def logout(refresh_token: str = Body(...), device_id: str = Body(...)):
     try:
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
-        revoke_refresh_token(payload.get("sub"), device_id)
+        await revoke_refresh_token(payload.get("sub"), device_id)
     except jwt.InvalidTokenError:
         pass
     return {"detail": "Logged out successfully"}
\ No newline at end of file
@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from auth.dependencies import get_db
-from models import UserInfo, Board
+from database import get_db
+from dependencies import get_cached_user
+from models import Board, UserInfo
 from schemas import BoardCreate, BoardResponse
-from routes.user_routes import get_current_user
+from user_cache import CachedUser
 from config import FREE_TIER_MAX_BOARDS
 
 
@@ -12,19 +21,21 @@ router = APIRouter(prefix="/boards", tags=["Boards"])
 @router.post("/", response_model=BoardResponse)
 async def create_board(
     board_data: BoardCreate,
-    current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CachedUser = Depends(get_cached_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    # 1. Перевірка лімітів
+    # 1. Перевірка лімітів: умовний інкремент лічильника дошок замість COUNT(*).
+    # UPDATE блокує рядок користувача до commit, тож паралельні запити
+    # не перевищать FREE_TIER_MAX_BOARDS.
+    reserve = update(UserInfo).where(UserInfo.internal_id == current_user.internal_id)
     if not current_user.is_pro:
-        # Рахуємо поточну кількість дошок користувача
-        current_board_count = db.query(Board).filter(Board.owner_id == current_user.internal_id).count()
-        
-        if current_board_count >= FREE_TIER_MAX_BOARDS:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Free tier limit reached. Please upgrade to Pro to create more boards."
-            )
+        reserve = reserve.where(UserInfo.board_count < FREE_TIER_MAX_BOARDS)
+    result = await db.execute(reserve.values(board_count=UserInfo.board_count + 1))
+    if result.rowcount == 0:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Free tier limit reached. Please upgrade to Pro to create more boards."
+        )
 
     # 2. Створення дошки
     new_board = Board(
@@ -32,28 +43,109 @@ async def create_board(
         owner_id=current_user.internal_id
     )
     db.add(new_board)
-    db.commit()
-    db.refresh(new_board)
+    await db.commit()
+    await db.refresh(new_board)
     
     return new_board
 
+# ===== Список дошок: keyset-пагінація, проєкція полів, ETag =====
+BOARD_FIELDS = tuple(BoardResponse.model_fields)
+BOARDS_PAGE_DEFAULT = 100
+BOARDS_PAGE_MAX = 500
+
+
+def _encode_cursor(created_at: datetime, board_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), board_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, board_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), str(board_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_fields(fields: Optional[str]) -> tuple[str, ...]:
+    if not fields:
+        return BOARD_FIELDS
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in BOARD_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(BOARD_FIELDS)}")
+    return requested or BOARD_FIELDS
+
+
+def _if_none_match(request: Request) -> set[str]:
+    # W/ префікс ігноруємо: проксі з gzip роблять ETag слабким
+    header = request.headers.get("if-none-match", "")
+    return {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
 @router.get("/", response_model=list[BoardResponse])
 async def get_my_boards(
-    current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=BOARDS_PAGE_MAX),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor з попередньої сторінки"),
+    fields: Optional[str] = Query(None, description="Через кому, напр. id,name"),
+    current_user: CachedUser = Depends(get_cached_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    return db.query(Board).filter(Board.owner_id == current_user.internal_id).all()
+    """
+    Дошки користувача від найновіших, сторінками по limit.
+    Наступна сторінка — ?cursor= із заголовка X-Next-Cursor (його немає на останній).
+    Без limit і cursor — усі дошки одним списком, як до пагінації: старі клієнти
+    не знають про X-Next-Cursor і не мають втрачати дошки після сотої.
+    Тіло сторінки має ETag: з If-None-Match незмінна сторінка повертає 304 без тіла.
+    """
+    # Користувач — з user_cache: видалений акаунт не бачить дошок навіть з живим токеном
+    selected = _parse_fields(fields)
+    # created_at та id потрібні для курсора, навіть якщо їх не просили
+    columns = dict.fromkeys((*selected, "created_at", "id"))
+    query = select(*(getattr(Board, name) for name in columns)).where(Board.owner_id == current_user.internal_id)
+    if cursor:
+        query = query.where(tuple_(Board.created_at, Board.id) < tuple_(*_decode_cursor(cursor)))
+    query = query.order_by(Board.created_at.desc(), Board.id.desc())
+    if limit is None and cursor:
+        limit = BOARDS_PAGE_DEFAULT
+    if limit is not None:
+        # +1 рядок, щоб знати, чи є наступна сторінка; порядок збігається з індексом
+        query = query.limit(limit + 1)
+    rows = (await db.execute(query)).all()
+
+    headers = {"Cache-Control": "private, no-cache"}
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    body = json.dumps(
+        jsonable_encoder([{name: getattr(row, name) for name in selected} for row in rows]),
+        separators=(",", ":"),
+    ).encode()
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers["ETag"] = etag
+    if_none_match = _if_none_match(request)
+    if etag in if_none_match or "*" in if_none_match:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 @router.delete("/{board_id}")
 async def delete_board(
     board_id: str,
-    current_user: UserInfo = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CachedUser = Depends(get_cached_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    board = db.query(Board).filter(Board.id == board_id, Board.owner_id == current_user.internal_id).first()
+    board = await db.scalar(select(Board).where(Board.id == board_id, Board.owner_id == current_user.internal_id))
     if not board:
         raise HTTPException(status_code=404, detail="Board not found")
         
-    db.delete(board)
-    db.commit()
+    await db.delete(board)
+    await db.execute(
+        update(UserInfo)
+        .where(UserInfo.internal_id == current_user.internal_id, UserInfo.board_count > 0)
+        .values(board_count=UserInfo.board_count - 1)
+    )
+    await db.commit()
     return {"message": "Board deleted"}
\ No newline at end of file
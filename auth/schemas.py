@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel, EmailStr
 
 class RegisterRequest(BaseModel):
@@ -29,7 +31,7 @@ class BoardResponse(BaseModel):
     id: str
     name: str
     owner_id: str
-    created_at: str
+    created_at: datetime
 
     class Config:
         from_attributes = True
\ No newline at end of file
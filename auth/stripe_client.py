@@ -0,0 +1,151 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import stripe
+
+import config
+
+# ===== Клієнт Stripe =====
+# Асинхронні виклики через StripeClient + HTTPXClient: один httpx.AsyncClient
+# на процес з keep-alive пулом, без блокування event loop.
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", 10.0))  # сек на запит
+# Повтори мережевих помилок; POST іде з Idempotency-Key, тож повтор безпечний
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", 2))
+# Для локального stripe-mock: STRIPE_API_BASE=http://localhost:12111
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")
+# Circuit breaker: після стількох збоїв поспіль Stripe вважаємо недоступним на STRIPE_BREAKER_RESET сек
+STRIPE_BREAKER_FAILURES = int(os.getenv("STRIPE_BREAKER_FAILURES", 5))
+STRIPE_BREAKER_RESET = float(os.getenv("STRIPE_BREAKER_RESET", 30.0))
+# Кеш Checkout.Session для /success: оплачена сесія вже не зміниться,
+# неоплачену перевіряємо частіше
+STRIPE_SESSION_CACHE_TTL = float(os.getenv("STRIPE_SESSION_CACHE_TTL", 600))
+STRIPE_SESSION_PENDING_TTL = float(os.getenv("STRIPE_SESSION_PENDING_TTL", 5))
+STRIPE_SESSION_CACHE_SIZE = int(os.getenv("STRIPE_SESSION_CACHE_SIZE", 1024))
+
+
+class StripeUnavailable(Exception):
+    """Circuit breaker розімкнено — Stripe не викликаємо до retry_after сек."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Stripe is unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def _is_outage(error: Exception) -> bool:
+    # Мережа, таймаути та 5xx — проблема Stripe; 4xx — помилка запиту, breaker не чіпає
+    if isinstance(error, stripe.APIConnectionError):
+        return True
+    return isinstance(error, stripe.StripeError) and (error.http_status or 0) >= 500
+
+
+class CircuitBreaker:
+    """
+    closed -> (failures поспіль) -> open -> (reset сек) -> half-open:
+    пропускається один пробний запит; успіх замикає, збій знову розмикає.
+    """
+
+    def __init__(self, failures: int = STRIPE_BREAKER_FAILURES, reset: float = STRIPE_BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self._opened_at >= self.reset else "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial):
+            self.stats["rejected"] += 1
+            raise StripeUnavailable(max(1.0, self.reset - (time.monotonic() - self._opened_at)))
+        if state == "half-open":
+            self._trial = True
+        self.stats["calls"] += 1
+
+    def on_success(self):
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+
+    def on_failure(self, error: Exception):
+        if not _is_outage(error):
+            # Відповідь від Stripe була — для breaker це успіх
+            self.on_success()
+            return
+        self.stats["failures"] += 1
+        self._consecutive += 1
+        if self._trial or self._consecutive >= self.failures:
+            if self._opened_at is None or self._trial:
+                self.stats["opened"] += 1
+                print(f"[STRIPE] Circuit open for {self.reset:.0f}s after: {error}")
+            self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class StripeGateway:
+    """Виклики Stripe, які потрібні роутам оплати, — асинхронно і за breaker."""
+
+    def __init__(self, api_key: str = config.STRIPE_SECRET_KEY, api_base: Optional[str] = STRIPE_API_BASE):
+        self._http = stripe.HTTPXClient(timeout=STRIPE_TIMEOUT)
+        self.client = stripe.StripeClient(
+            api_key,
+            http_client=self._http,
+            max_network_retries=STRIPE_MAX_RETRIES,
+            base_addresses={"api": api_base} if api_base else None,
+        )
+        self.breaker = CircuitBreaker()
+        # {session_id: (expires_at, session)}
+        self._sessions: "OrderedDict[str, Tuple[float, stripe.checkout.Session]]" = OrderedDict()
+        self.stats = {"session_cache_hits": 0, "session_cache_misses": 0}
+
+    async def _call(self, method, *args, **kwargs):
+        self.breaker.before_call()
+        try:
+            result = await method(*args, **kwargs)
+        except Exception as e:
+            self.breaker.on_failure(e)
+            raise
+        self.breaker.on_success()
+        return result
+
+    async def create_customer(self, **params) -> stripe.Customer:
+        return await self._call(self.client.v1.customers.create_async, params=params)
+
+    async def create_checkout_session(self, **params) -> stripe.checkout.Session:
+        return await self._call(self.client.v1.checkout.sessions.create_async, params=params)
+
+    async def retrieve_checkout_session(self, session_id: str) -> stripe.checkout.Session:
+        """Оновлення сторінки /success не ходить у Stripe повторно (див. STRIPE_SESSION_CACHE_TTL)."""
+        cached = self._sessions.get(session_id)
+        if cached is not None and cached[0] > time.monotonic():
+            self._sessions.move_to_end(session_id)
+            self.stats["session_cache_hits"] += 1
+            return cached[1]
+
+        self.stats["session_cache_misses"] += 1
+        session = await self._call(self.client.v1.checkout.sessions.retrieve_async, session_id)
+        ttl = STRIPE_SESSION_CACHE_TTL if session.payment_status == "paid" else STRIPE_SESSION_PENDING_TTL
+        self._sessions[session_id] = (time.monotonic() + ttl, session)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > STRIPE_SESSION_CACHE_SIZE:
+            self._sessions.popitem(last=False)
+        return session
+
+    async def modify_subscription(self, subscription_id: str, **params) -> stripe.Subscription:
+        return await self._call(self.client.v1.subscriptions.update_async, subscription_id, params=params)
+
+    async def close(self):
+        await self._http.close_async()
+
+    def metrics(self) -> dict:
+        return {**self.stats, **self.breaker.stats, "breaker": self.breaker.state}
+
+
+stripe_gateway = StripeGateway()
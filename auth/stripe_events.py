@@ -0,0 +1,227 @@
+import asyncio
+import json
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import StripeEvent
+from user_cache import publish_invalidation
+
+# ===== Черга подій Stripe =====
+STRIPE_EVENT_BATCH_SIZE = int(os.getenv("STRIPE_EVENT_BATCH_SIZE", 50))
+# Нові події будять воркер одразу; опитування — для повторів і подій з інших воркерів
+STRIPE_EVENT_POLL_INTERVAL = float(os.getenv("STRIPE_EVENT_POLL_INTERVAL", 5.0))
+# Після пробудження чекаємо, щоб набралась пачка (і не змагатися з вебхуком за кожен commit)
+STRIPE_EVENT_BATCH_WAIT_MS = int(os.getenv("STRIPE_EVENT_BATCH_WAIT_MS", 100))
+# Скільки воркер тримає взяту подію; після цього її може взяти інший процес
+STRIPE_EVENT_LEASE = float(os.getenv("STRIPE_EVENT_LEASE", 60.0))
+STRIPE_EVENT_MAX_ATTEMPTS = int(os.getenv("STRIPE_EVENT_MAX_ATTEMPTS", 8))
+STRIPE_EVENT_RETRY_BASE = float(os.getenv("STRIPE_EVENT_RETRY_BASE", 5.0))  # сек, далі 2x на спробу
+STRIPE_EVENT_RETRY_MAX = float(os.getenv("STRIPE_EVENT_RETRY_MAX", 3600.0))
+# Оброблені події тримаємо для дедуплікації: Stripe повторює доставку до 3 днів
+STRIPE_EVENT_RETENTION_DAYS = int(os.getenv("STRIPE_EVENT_RETENTION_DAYS", 30))
+
+# Обробник отримує data.object події і сесію; commit робить воркер.
+# Повертає internal_id користувачів, яких треба прибрати з кешів усіх процесів.
+Handler = Callable[[dict, AsyncSession], Awaitable[Optional[Iterable[str]]]]
+_handlers: Dict[str, Handler] = {}
+
+
+def register_handler(event_type: str):
+    def decorator(fn: Handler) -> Handler:
+        _handlers[event_type] = fn
+        return fn
+    return decorator
+
+
+def handles(event_type: str) -> bool:
+    return event_type in _handlers
+
+
+def dedup_key_for(event: dict) -> str:
+    # Оплату checkout-сесії зараховуємо один раз, хоч би скільки подій про неї прийшло
+    if event["type"] == "checkout.session.completed":
+        return event["data"]["object"]["id"]
+    return event["id"]
+
+
+async def enqueue_event(db: AsyncSession, event: dict, payload: Optional[str] = None) -> bool:
+    """
+    Зберігає подію в stripe_events. False — дублікат (той самий event_id
+    або та сама checkout-сесія вже в черзі чи оброблена).
+    """
+    db.add(StripeEvent(
+        event_id=event["id"],
+        dedup_key=dedup_key_for(event),
+        type=event["type"],
+        payload=payload if payload is not None else json.dumps(event),
+    ))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        stripe_event_worker.stats["duplicates"] += 1
+        return False
+    stripe_event_worker.stats["enqueued"] += 1
+    stripe_event_worker.notify()
+    return True
+
+
+class StripeEventWorker:
+    """
+    Фоновий обробник stripe_events у кожному процесі.
+
+    Бере до STRIPE_EVENT_BATCH_SIZE подій одним UPDATE з власною міткою (claim),
+    тож кілька воркерів не оброблять ту саму подію. Кожна подія обробляється
+    в окремій транзакції разом із позначкою done — ефект і позначка або
+    комітяться разом, або ні. Помилки повторюються з експоненційною затримкою,
+    після STRIPE_EVENT_MAX_ATTEMPTS подія лишається зі статусом failed.
+    """
+
+    def __init__(self, batch_size: int = STRIPE_EVENT_BATCH_SIZE, poll_interval: float = STRIPE_EVENT_POLL_INTERVAL):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_prune = 0.0
+        self.stats = {"enqueued": 0, "duplicates": 0, "processed": 0, "retried": 0, "failed": 0,
+                      "lease_lost": 0, "batches": 0}
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def notify(self):
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                processed = await self.process_batch()
+                await self._prune()
+            except Exception as e:
+                print(f"[STRIPE] Worker error: {e}")
+                processed = 0
+            if processed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                    await asyncio.sleep(STRIPE_EVENT_BATCH_WAIT_MS / 1000)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _claim(self, db: AsyncSession, token: str) -> list:
+        now = datetime.utcnow()
+        # processing з простроченою орендою — воркер помер посеред обробки
+        ready = (
+            select(StripeEvent.event_id)
+            .where(StripeEvent.status.in_(("pending", "processing")), StripeEvent.available_at <= now)
+            .order_by(StripeEvent.available_at)
+            .limit(self.batch_size)
+        )
+        await db.execute(
+            update(StripeEvent)
+            .where(
+                StripeEvent.event_id.in_(ready.scalar_subquery()),
+                StripeEvent.status.in_(("pending", "processing")),
+                StripeEvent.available_at <= now,
+            )
+            .values(
+                status="processing",
+                claim=token,
+                attempts=StripeEvent.attempts + 1,
+                available_at=now + timedelta(seconds=STRIPE_EVENT_LEASE),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        # Рядки, а не ORM-об'єкти: rollback після помилки однієї події не зачепить решту
+        return list((await db.execute(
+            select(StripeEvent.event_id, StripeEvent.type, StripeEvent.payload, StripeEvent.attempts)
+            .where(StripeEvent.claim == token)
+            .order_by(StripeEvent.received_at)
+        )).all())
+
+    async def process_batch(self) -> int:
+        """Обробляє одну пачку. Повертає кількість взятих подій."""
+        token = uuid.uuid4().hex
+        invalidate: List[str] = []
+        async with AsyncSessionLocal() as db:
+            events = await self._claim(db, token)
+            for event in events:
+                try:
+                    data = json.loads(event.payload)["data"]["object"]
+                    user_ids = await _handlers[event.type](data, db)
+                    done = await db.execute(
+                        update(StripeEvent)
+                        .where(StripeEvent.event_id == event.event_id, StripeEvent.claim == token)
+                        .values(status="done", claim=None, last_error=None, processed_at=datetime.utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
+                    if done.rowcount == 0:
+                        # Оренда минула і подію взяв інший воркер — наш ефект відкочуємо
+                        await db.rollback()
+                        self.stats["lease_lost"] += 1
+                        continue
+                    await db.commit()
+                    invalidate.extend(user_ids or ())
+                    self.stats["processed"] += 1
+                except Exception as e:
+                    await db.rollback()
+                    await self._failed(db, event, token, e)
+        if events:
+            self.stats["batches"] += 1
+        if invalidate:
+            await publish_invalidation(*invalidate)
+        return len(events)
+
+    async def _failed(self, db: AsyncSession, event, token: str, error: Exception):
+        last_error = f"{type(error).__name__}: {error}"
+        if event.attempts >= STRIPE_EVENT_MAX_ATTEMPTS:
+            values = {"status": "failed", "claim": None, "last_error": last_error}
+            self.stats["failed"] += 1
+            print(f"[STRIPE] Event {event.event_id} ({event.type}) failed after {event.attempts} attempts: {last_error}")
+        else:
+            delay = min(STRIPE_EVENT_RETRY_BASE * 2 ** (event.attempts - 1), STRIPE_EVENT_RETRY_MAX)
+            delay *= random.uniform(0.8, 1.2)
+            values = {"status": "pending", "claim": None, "last_error": last_error,
+                      "available_at": datetime.utcnow() + timedelta(seconds=delay)}
+            self.stats["retried"] += 1
+            print(f"[STRIPE] Retry {event.attempts}/{STRIPE_EVENT_MAX_ATTEMPTS} of {event.event_id} in {delay:.0f}s: {last_error}")
+        await db.execute(
+            update(StripeEvent)
+            .where(StripeEvent.event_id == event.event_id, StripeEvent.claim == token)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+    async def _prune(self):
+        loop = asyncio.get_running_loop()
+        if loop.time() - self._last_prune < 3600:
+            return
+        self._last_prune = loop.time()
+        cutoff = datetime.utcnow() - timedelta(days=STRIPE_EVENT_RETENTION_DAYS)
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(StripeEvent).where(StripeEvent.status == "done", StripeEvent.processed_at < cutoff))
+            await db.commit()
+
+    async def metrics(self) -> dict:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(StripeEvent.status, func.count()).group_by(StripeEvent.status))).all()
+        return {**self.stats, "queue": {status: count for status, count in rows}}
+
+
+stripe_event_worker = StripeEventWorker()
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from redis_utils import async_r
+
+# ===== Кеш користувачів для get_current_user =====
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))  # сек
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+
+
+class CachedUser:
+    """
+    Незмінний знімок UserInfo для маршрутів, що лише читають користувача.
+    Не прив'язаний до сесії БД, тож його не можна змінювати й комітити —
+    для запису є get_current_user з dependencies.py.
+    """
+    __slots__ = ("internal_id", "public_id", "email", "username", "_is_pro", "pro_expires_at")
+
+    def __init__(self, internal_id: str, public_id: str, email: str, username: str,
+                 is_pro: bool, pro_expires_at: Optional[datetime]):
+        self.internal_id = internal_id
+        self.public_id = public_id
+        self.email = email
+        self.username = username
+        self._is_pro = bool(is_pro)
+        self.pro_expires_at = pro_expires_at
+
+    @classmethod
+    def from_user(cls, user) -> "CachedUser":
+        return cls(user.internal_id, user.public_id, user.email, user.username, user.is_pro, user.pro_expires_at)
+
+    @property
+    def is_pro(self) -> bool:
+        # PRO з терміном дії, що минув, вважаємо вимкненим і без запису в БД
+        if self._is_pro and self.pro_expires_at and datetime.utcnow() > self.pro_expires_at:
+            return False
+        return self._is_pro
+
+
+class UserCache:
+    """
+    TTL/LRU кеш CachedUser за internal_id у пам'яті процесу.
+    Після будь-якої зміни користувача (профіль, видалення, оплата)
+    викликайте invalidate(), щоб наступний запит перечитав БД.
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, max_users: int = USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_users = max_users
+        # {internal_id: (expires_at, CachedUser)}
+        self._lru: "OrderedDict[str, Tuple[float, CachedUser]]" = OrderedDict()
+
+    def get(self, user_id: str) -> Optional[CachedUser]:
+        entry = self._lru.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._lru[user_id]
+            return None
+        self._lru.move_to_end(user_id)
+        return entry[1]
+
+    def put(self, user: CachedUser):
+        if self.ttl <= 0:
+            return
+        self._lru[user.internal_id] = (time.monotonic() + self.ttl, user)
+        self._lru.move_to_end(user.internal_id)
+        while len(self._lru) > self.max_users:
+            self._lru.popitem(last=False)
+
+    def invalidate(self, *user_ids: str):
+        for user_id in user_ids:
+            self._lru.pop(user_id, None)
+
+    def clear(self):
+        self._lru.clear()
+
+
+user_cache = UserCache()
+
+
+# ===== Інвалідація між процесами =====
+# Кеш у кожного воркера свій: зміни, зроблені не запитом цього ж процесу
+# (оплата, вимкнення PRO за терміном), розсилаються через Redis pub/sub.
+USER_INVALIDATION_CHANNEL = os.getenv("USER_INVALIDATION_CHANNEL", "users:invalidate")
+
+
+async def publish_invalidation(*user_ids: str):
+    """Скидає користувачів у цьому процесі і повідомляє решту."""
+    if not user_ids:
+        return
+    user_cache.invalidate(*user_ids)
+    try:
+        await async_r.publish(USER_INVALIDATION_CHANNEL, json.dumps(user_ids))
+    except RedisError as e:
+        # Інші воркери перечитають користувача не пізніше ніж за USER_CACHE_TTL
+        print(f"[CACHE] Failed to publish invalidation of {len(user_ids)} users: {e}")
+
+
+class UserInvalidationListener:
+    """
+    Підписка на USER_INVALIDATION_CHANNEL у кожному процесі: скидає user_cache
+    і викликає додаткові обробники (напр. кеш admission у coll_server).
+    Після обриву з'єднання перепідписується; пропущені повідомлення
+    покриває TTL кешів.
+    """
+
+    def __init__(self, channel: str = USER_INVALIDATION_CHANNEL):
+        self.channel = channel
+        self._handlers: List[Callable[[List[str]], None]] = [lambda user_ids: user_cache.invalidate(*user_ids)]
+        self._task: Optional[asyncio.Task] = None
+
+    def add_handler(self, handler: Callable[[List[str]], None]):
+        self._handlers.append(handler)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            pubsub = async_r.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    user_ids = json.loads(message["data"])
+                    for handler in self._handlers:
+                        handler(user_ids)
+            except (RedisError, OSError) as e:
+                print(f"[CACHE] Invalidation listener error: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+
+user_invalidations = UserInvalidationListener()
@@ -1,8 +1,8 @@
 from redis_utils import (
-    record_login_attempt,
-    check_login_attempts,
-    reset_login_attempt,
+    hit_rate_limit,
     store_refresh_token,
     is_refresh_token_valid,
+    rotate_refresh_token,
     revoke_refresh_token,
+    revoke_all_refresh_tokens,
 )
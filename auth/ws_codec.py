@@ -0,0 +1,79 @@
+import json
+import os
+import zlib
+
+# orjson — необов'язковий, але в рази швидший кодек. Без нього працюємо на stdlib json.
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(message) -> str:
+        return orjson.dumps(message).decode("utf-8")
+
+    def loads(frame: str | bytes):
+        return orjson.loads(frame)
+else:
+    def dumps(message) -> str:
+        # Ті ж параметри, що й у Starlette send_json
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+    def loads(frame: str | bytes):
+        return json.loads(frame)
+
+
+CODEC_NAME = "orjson" if orjson is not None else "json"
+
+
+# ===== Бінарні кадри =====
+# Вхідний кадр від клієнта:
+#   [0x00][тіло]                      — бродкаст усім, крім відправника
+#   [0x01][36 байт peer_id][тіло]     — особисте повідомлення
+# Вихідний кадр до отримувача: [той самий тип][36 байт peer_id відправника][тіло].
+# Тіло сервер не розбирає і пересилає як є.
+BINARY_BROADCAST = 0x00
+BINARY_DIRECT = 0x01
+PEER_ID_LEN = 36  # str(uuid4)
+
+
+def unpack_binary(data: bytes) -> tuple[int, str | None, memoryview]:
+    """Розбирає заголовок вхідного бінарного кадру. ValueError — якщо кадр битий."""
+    if not data:
+        raise ValueError("empty binary frame")
+
+    kind = data[0]
+    if kind == BINARY_BROADCAST:
+        return kind, None, memoryview(data)[1:]
+    if kind == BINARY_DIRECT:
+        if len(data) < 1 + PEER_ID_LEN:
+            raise ValueError("binary frame too short for target peer id")
+        return kind, data[1:1 + PEER_ID_LEN].decode("ascii"), memoryview(data)[1 + PEER_ID_LEN:]
+    raise ValueError(f"unknown binary frame kind: {kind}")
+
+
+def pack_binary(kind: int, from_peer: str, body) -> bytes:
+    return b"".join((bytes((kind,)), from_peer.encode("ascii"), body))
+
+
+# ===== Стиснення та обмеження розміру =====
+# Кадри, більші за поріг, стискаються для пірів, що підключилися з ?compress=deflate,
+# і йдуть бінарним кадром [0x02][raw deflate JSON]. Дрібні кадри лишаються як є.
+BINARY_DEFLATE_JSON = 0x02
+WS_COMPRESS_MIN_BYTES = int(os.getenv("WS_COMPRESS_MIN_BYTES", 4096))
+# Рівень 1: ~4.4x на знімках дошки при ~2.5x меншому CPU, ніж рівень 6 (benchmarks/ws_compression.py)
+WS_COMPRESS_LEVEL = int(os.getenv("WS_COMPRESS_LEVEL", 1))
+# Жорстка межа вхідного кадру; більші кадри закривають з'єднання з кодом 1009
+WS_MAX_FRAME_BYTES = int(os.getenv("WS_MAX_FRAME_BYTES", 8 * 1024 * 1024))
+# Узгодження permessage-deflate на рівні протоколу (uvicorn, див. main.py)
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "false").lower() in ("1", "true", "yes")
+
+
+def should_compress(frame: str | bytes) -> bool:
+    return isinstance(frame, str) and len(frame) >= WS_COMPRESS_MIN_BYTES
+
+
+def deflate_frame(frame: str) -> bytes:
+    compressor = zlib.compressobj(WS_COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return b"".join((bytes((BINARY_DEFLATE_JSON,)), compressor.compress(frame.encode("utf-8")), compressor.flush()))
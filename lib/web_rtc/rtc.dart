@@ -219,6 +219,10 @@ class WebRTCManager {
       case 'kick':
         disconnect();
         break;
+      case 'ping':
+        // Heartbeat сервера: без відповіді з'єднання вважається мертвим
+        _sendSignalingMessage({'type': 'pong'});
+        break;
     }
   }
 